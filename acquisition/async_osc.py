@@ -0,0 +1,584 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    async_osc.py                                       :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/19 09:48:05 by abrar             #+#    #+#              #
+#    Updated: 2024/09/19 09:48:05 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Asyncio implementation of the Open Spherical Camera API, with the same
+commands as `osc.OpenSphericalCamera`, so that a single event loop can drive
+several cameras.
+
+    async with AsyncOpenSphericalCamera("192.168.1.1") as camera:
+        await camera.takePicture()
+
+Requires aiohttp.
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import aiohttp
+
+from osc import g_oscOptionDependents, g_oscOptions, g_oscVolatileOptions, localFileName
+
+
+__all__ = ['AsyncOpenSphericalCamera']
+
+_header = {"Content-Type": "application/json; charset=UTF-8",
+           "X-Content-Type-Options": "nosniff",
+           "X-XSRF-Protected": '1'}
+
+
+class AsyncOpenSphericalCamera:
+    # Class variables / methods
+    oscOptions = g_oscOptions
+    oscOptionDependents = g_oscOptionDependents
+    oscVolatileOptions = g_oscVolatileOptions
+
+    # Instance variables / methods
+    def __init__(self, ip_base: str = "192.168.1.1", httpPort: int = 80,
+                 poolSize: int = 4, timeout: float | tuple[float, float] = (5.0, 30.0),
+                 keepAlive: bool = True) -> None:
+        """
+        The HTTP session is opened by `connect`, or when entering the
+        `async with` block, inside the running event loop.
+        """
+        self.sid = None
+        self.fingerprint = None
+        self.processingTimes = []
+        self._options = {}
+        self._api = None
+        self._info = None
+
+        self._ip = ip_base
+        self._httpPort = httpPort
+        self._httpUpdatesPort = httpPort
+
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self._timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        self._poolSize = poolSize
+        self._keepAlive = keepAlive
+        self._session = None
+
+    async def __aenter__(self) -> "AsyncOpenSphericalCamera":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self.sid:
+            await self.closeSession()
+        await self.close()
+
+    async def connect(self) -> None:
+        """
+        Open the connection pool, start a session and retrieve the camera info.
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._poolSize,
+                                             force_close=not self._keepAlive)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+        await self.startSession()
+        self._info = await self.info()
+        if self._info:
+            self._api = self._info['api']
+            self._httpPort = self._info['endpoints']['httpPort']
+            self._httpUpdatesPort = self._info['endpoints']['httpUpdatesPort']
+
+    async def close(self) -> None:
+        """
+        Release the pooled connections to the camera.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _request(self, url_request: str, update: bool = False) -> str:
+        """
+        Generate the URI to send to the Open Spherical Camera.
+        All calls start with /osc/
+        """
+        osc_request = "/osc/" + url_request
+
+        url_base = f"http://{self._ip}:{self._httpPort if not update else self._httpUpdatesPort}"
+
+        if self._api and osc_request not in self._api:
+            print( "OSC Error - Unsupported API  : %s" % osc_request )
+            print( "OSC Error - Supported API is : %s" % self._api )
+            return None
+        return url_base + osc_request
+
+    def _httpError(self, exception) -> None:
+        print( "HTTP Error - begin" )
+        print( repr(exception) )
+        print( "HTTP Error - end" )
+
+    async def _oscError(self, response: aiohttp.ClientResponse) -> int:
+        status = response.status
+
+        try:
+            error = await response.json(content_type=None)
+
+            print( "OSC Error - HTTP Status : %s" % status)
+            if 'error' in error:
+                print( "OSC Error - Code        : %s" % error['error']['code'])
+                print( "OSC Error - Message     : %s" % error['error']['message'])
+            print( "OSC Error - Name        : %s" % error['name'])
+            print( "OSC Error - State       : %s" % error['state'])
+        except:
+            print( "OSC Error - HTTP Status : %s" % status)
+
+        return status
+
+    async def _post(self, url_request: str, payload: dict | None = None) -> (dict | None):
+        """
+        POST a JSON payload and return the decoded answer, or None on error.
+        """
+        url = self._request(url_request)
+        data = json.dumps(payload) if payload is not None else None
+        try:
+            async with self._session.post(url, data=data, headers=_header) as response:
+                if response.status == 200:
+                    return await response.json(content_type=None)
+                await self._oscError(response)
+                return None
+        except Exception as e:
+            self._httpError(e)
+            return None
+
+    async def _execute(self, name: str, parameters: dict) -> (dict | None):
+        """
+        Run a command with commands/execute.
+        """
+        return await self._post("commands/execute", {"name": name, "parameters": parameters})
+
+    def getOptionNames(self) -> list[str]:
+        return self.oscOptions
+
+    def getOptionDependents(self) -> dict:
+        return self.oscOptionDependents
+
+    def getVolatileOptions(self) -> list[str]:
+        return self.oscVolatileOptions
+
+    async def info(self) -> (dict | None):
+        """
+        Get basic information on the camera.  Note that this is a GET call
+        and not a POST.  Most of the calls are POST.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/guides/osc/info
+        """
+        url = self._request("info")
+        try:
+            async with self._session.get(url) as response:
+                if response.status == 200:
+                    return await response.json(content_type=None)
+                await self._oscError(response)
+                return None
+        except Exception as e:
+            self._httpError(e)
+            return None
+
+    async def state(self) -> (dict | None):
+        """
+        Get the state of the camera, which will include the sessionsId and also the
+        latestFileUri if you've just taken a picture.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/guides/osc/state
+        """
+        response = await self._post("state")
+        if response is None:
+            return None
+        self.fingerprint = response['fingerprint']
+        return response['state']
+
+    async def status(self, command_id: str) -> (str | None):
+        """
+        Returns the status for previous inProgress commands.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/guides/osc/commands/status
+        """
+        response = await self.commandStatus(command_id)
+        return response['state'] if response else None
+
+    async def commandStatus(self, command_id: str) -> (dict | None):
+        """
+        Returns the whole status response for previous inProgress commands.
+        """
+        return await self._post("commands/status", {"id": command_id})
+
+    async def checkForUpdates(self, invalidate: bool = True) -> bool:
+        """
+        Check for updates on the camera, using the current state fingerprint.
+        With `invalidate`, the cached options are forgotten when the state
+        changed.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/guides/osc/checkforupdates
+        """
+        if self.fingerprint is None:
+            await self.state()
+
+        response = await self._post("checkForUpdates", {"stateFingerprint": self.fingerprint})
+        if response is None:
+            return False
+        newFingerprint = response['stateFingerprint']
+        if newFingerprint != self.fingerprint:
+            self.fingerprint = newFingerprint
+            if invalidate:
+                self.invalidateOptions()
+            return True
+        return False
+
+    async def waitForProcessing(self, command_id: str, maxWait: float = 20, firstDelay: float = 0.05,
+                                maxDelay: float = 0.25, backoff: float = 2.0,
+                                useUpdates: bool = False) -> (dict | None):
+        """
+        Helper function that will poll the camera until the status to changes
+        to 'done' or the timeout is hit. See
+        `osc.OpenSphericalCamera.waitForProcessing`.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/guides/osc/commands/status
+        """
+        start = time.monotonic()
+        deadline = start + maxWait
+        delay = firstDelay
+        first = True
+        if useUpdates:
+            # Reference fingerprint of the wait, see osc.OpenSphericalCamera.waitForProcessing
+            await self.state()
+        while True:
+            if not useUpdates or first or await self.checkForUpdates(invalidate=False):
+                first = False
+                response = await self.commandStatus(command_id)
+                status = response['state'] if response else None
+                if status == "done":
+                    self.processingTimes.append(time.monotonic() - start)
+                    return response
+                elif not status or "error" in status:
+                    return response
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep( min(delay, remaining) )
+            delay = min(delay * backoff, maxDelay)
+
+    def processingStats(self) -> (dict | None):
+        """
+        Distribution of the processing times observed by waitForProcessing,
+        in seconds.
+        """
+        if not self.processingTimes:
+            return None
+        times = sorted(self.processingTimes)
+        return {
+            "count": len(times),
+            "mean": statistics.fmean(times),
+            "min": times[0],
+            "median": statistics.median(times),
+            "p90": times[min(len(times) - 1, int(0.9 * len(times)))],
+            "max": times[-1],
+        }
+
+    async def startSession(self) -> (str | None):
+        """
+        Start a new session.  Grab the sessionId number and return it.
+        You'll need the sessionId to take a video or image.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/startsession
+        """
+        response = await self._execute("camera.startSession", {})
+        self.sid = response["results"]["sessionId"] if response else None
+        self.invalidateOptions()
+        return self.sid
+
+    async def updateSession(self) -> (dict | None):
+        """
+        Update a session, using the sessionId.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/updatesession
+        """
+        return await self._execute("camera.updateSession", {"sessionId": self.sid})
+
+    async def closeSession(self) -> (dict | None):
+        """
+        Close a session.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/closesession
+        """
+        response = await self._execute("camera.closeSession", {"sessionId": self.sid})
+        if response is not None:
+            self.sid = None
+            self.invalidateOptions()
+        return response
+
+    async def takePicture(self) -> (dict | None):
+        """
+        Take a still image.  The sessionId is either taken from
+        startSession or from state.  You can change the mode
+        from video to image with captureMode in the options.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/takepicture
+        """
+        if self.sid == None:
+            return None
+        return await self._execute("camera.takePicture", {"sessionId": self.sid})
+
+    async def listImages(self, entryCount: int = 3, maxSize: int = 160, continuationToken: str = None, includeThumb: bool = False) -> (dict | None):
+        """
+        See `osc.OpenSphericalCamera.listImages`.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/listimages
+        """
+        parameters = {
+                "entryCount": entryCount,
+                "includeThumb": includeThumb,
+             }
+        if maxSize is not None:
+            parameters['maxSize'] = maxSize
+        if continuationToken is not None:
+            parameters['continuationToken'] = continuationToken
+        return await self._execute("camera.listImages", parameters)
+
+    async def delete(self, fileUri: str) -> (dict | None):
+        """
+        Delete the image with the named fileUri
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/delete
+        """
+        return await self._execute("camera.delete", {"fileUri": fileUri})
+
+    async def getMetadata(self, fileUri: str) -> (dict | None):
+        """
+        Get the exif and xmp metadata associated with the named fileUri
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/getmetadata
+        """
+        return await self._execute("camera.getMetadata", {"fileUri": fileUri})
+
+    async def setOption(self, option: str, value) -> (dict | None):
+        """
+        Set an option to a value. The validity of the option is checked. The
+        validity of the value is not.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/setoptions
+        """
+        if self.sid == None or option not in self.getOptionNames():
+            return None
+        return await self.setOptions({option: value})
+
+    async def setOptions(self, options: dict) -> (dict | None):
+        """
+        Set several options in a single command. See
+        `osc.OpenSphericalCamera.setOptions`.
+        """
+        if self.sid == None:
+            return None
+        optionNames = self.getOptionNames()
+        options = {option: value for option, value in options.items()
+                   if option in optionNames
+                   and (option not in self._options or self._options[option] != value)}
+        if not options:
+            return {"name": "camera.setOptions", "state": "done"}
+
+        response = await self._execute("camera.setOptions",
+                                       {"sessionId": self.sid, "options": options})
+        if response is not None:
+            self._evictDependents(options)
+            self._options.update(options)
+        return response
+
+    async def getOption(self, option) -> (str | None):
+        """
+        Get an option value. The validity of the option is not checked.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/getoptions
+        """
+        options = await self.getOptions([option])
+        return options.get(option) if options else None
+
+    async def getOptions(self, optionNames: list[str]) -> (dict | None):
+        """
+        Get several option values, from the option cache when possible. See
+        `osc.OpenSphericalCamera.getOptions`.
+        """
+        volatile = self.getVolatileOptions()
+        missing = [option for option in optionNames if option not in self._options or option in volatile]
+        fetched = {}
+        if missing:
+            response = await self._execute("camera.getOptions",
+                                           {"sessionId": self.sid, "optionNames": missing})
+            if response is None:
+                return None
+            fetched = response["results"]["options"]
+            self._cacheOptions(fetched)
+        values = {**self._options, **fetched}
+        return {option: values[option] for option in optionNames if option in values}
+
+    def invalidateOptions(self) -> None:
+        """
+        Forget the cached option values.
+        """
+        self._options = {}
+
+    def _cacheOptions(self, options: dict) -> None:
+        """
+        Keep option values retrieved from the camera, but the volatile ones.
+        """
+        volatile = self.getVolatileOptions()
+        self._options.update({option: value for option, value in options.items() if option not in volatile})
+
+    def _evictDependents(self, options: dict) -> None:
+        """
+        Forget the cached values of the options the camera may have changed
+        when setting options. See `osc.OpenSphericalCamera.setOptions`.
+        """
+        dependents = self.getOptionDependents()
+        for option in options:
+            if option in dependents and dependents[option] is None:
+                self._options = {}
+                return
+            for dependent in dependents.get(option, []):
+                self._options.pop(dependent, None)
+
+    async def getAllOptions(self) -> (dict | None):
+        """
+        Helper function that will get the value for all options.
+        """
+        response = await self._execute("camera.getOptions",
+                                       {"sessionId": self.sid, "optionNames": self.getOptionNames()})
+        if response is None:
+            return None
+        self._cacheOptions(response["results"]["options"])
+        return response["results"]["options"]
+
+    async def latestFileUri(self) -> (str | None):
+        """
+        Get the name of the last captured image or video from the state
+        """
+        state_data = await self.state()
+        return state_data["_latestFileUri"] if state_data else None
+
+    async def _saveStream(self, payload: dict, path: str,
+                          chunkSize: int = 1 << 20, resume: bool = True) -> bool:
+        """
+        Stream the response of a command to path, through a '.part' file
+        renamed once complete. See `osc.OpenSphericalCamera._saveStream`.
+
+        The file is written on worker threads, so that the disk never blocks
+        the event loop, i.e. the other transfers and the live preview.
+        """
+        url = self._request("commands/execute")
+        partPath = path + '.part'
+        offset = os.path.getsize(partPath) if resume and os.path.exists(partPath) else 0
+        header = dict(_header, Range="bytes=%d-" % offset) if offset else _header
+
+        try:
+            async with self._session.post(url, data=json.dumps(payload), headers=header) as response:
+                if response.status == 416 and offset:
+                    # Nothing left to transfer
+                    os.replace(partPath, path)
+                    return True
+                if response.status not in (200, 206):
+                    await self._oscError(response)
+                    return False
+
+                mode = 'ab' if response.status == 206 else 'wb'
+                handle = await asyncio.to_thread(open, partPath, mode)
+                try:
+                    async for block in response.content.iter_chunked(chunkSize):
+                        await asyncio.to_thread(handle.write, block)
+                finally:
+                    await asyncio.to_thread(handle.close)
+        except Exception as e:
+            # Keep the partial file to resume later
+            self._httpError(e)
+            return False
+
+        os.replace(partPath, path)
+        return True
+
+    def _downloadPayload(self, fileUri: str) -> dict:
+        """
+        Command used by downloadFiles to transfer fileUri.
+        """
+        return {"name": "camera.getImage",
+                "parameters": {"fileUri": fileUri, "_type": "image"}}
+
+    async def getImage(self, fileUri: str, imageType: str = "image", dir: str = './',
+                       chunkSize: int = 1 << 20) -> bool:
+        """
+        Transfer the file from the camera to computer and save the
+        binary data to local storage.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/getimage
+        """
+        d = dir + ('/' if not dir.endswith('/') else '')
+        payload = {"name": "camera.getImage",
+                   "parameters": {"fileUri": fileUri, "_type": imageType}}
+        return await self._saveStream(payload, d + localFileName(fileUri), chunkSize)
+
+    async def downloadFiles(self, files: list, dir: str = './', workers: int = 4,
+                            chunkSize: int = 1 << 20, resume: bool = True) -> dict[str, bool]:
+        """
+        Transfer several files from the camera concurrently. See
+        `osc.OpenSphericalCamera.downloadFiles`.
+        """
+        d = dir + ('/' if not dir.endswith('/') else '')
+        os.makedirs(d, exist_ok=True)
+        semaphore = asyncio.Semaphore(max(1, workers))
+
+        async def download(fileUri: str, path: str) -> bool:
+            async with semaphore:
+                return await self._saveStream(self._downloadPayload(fileUri), path, chunkSize, resume)
+
+        results = {}
+        pending = {}
+        for entry in files:
+            fileUri = entry['uri'] if isinstance(entry, dict) else entry
+            size = entry.get('size') if isinstance(entry, dict) else None
+            path = d + localFileName(fileUri)
+            if os.path.exists(path) and (size is None or os.path.getsize(path) == size):
+                results[fileUri] = True
+            else:
+                pending[fileUri] = path
+
+        acquired = await asyncio.gather(*(download(fileUri, path) for fileUri, path in pending.items()))
+        results.update(zip(pending, acquired))
+        return results
+
+    async def getLatestImage(self, imageType: str = "image") -> None:
+        """
+        Transfer the latest file from the camera to computer and save the
+        binary data to local storage.
+        """
+        fileUri = await self.latestFileUri()
+        if fileUri:
+            await self.getImage(fileUri, imageType)
+
+# AsyncOpenSphericalCamera
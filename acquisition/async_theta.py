@@ -0,0 +1,170 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    async_theta.py                                     :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/19 11:20:37 by abrar             #+#    #+#              #
+#    Updated: 2024/09/19 11:20:37 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Asyncio version of the Ricoh Theta S extensions of `theta.RicohThetaS`.
+
+Reference:
+https://developers.theta360.com/en/docs/v2/api_reference/
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator
+
+from async_osc import AsyncOpenSphericalCamera
+from mjpeg import MjpegDemuxer
+from osc import localFileName
+from theta import g_ricohOptionDependents, g_ricohOptions, g_ricohVolatileOptions
+
+
+__all__ = ['AsyncRicohThetaS']
+
+
+class AsyncRicohThetaS(AsyncOpenSphericalCamera):
+    # Class variables / methods
+    ricohOptions = g_ricohOptions
+    ricohOptionDependents = g_ricohOptionDependents
+    ricohVolatileOptions = g_ricohVolatileOptions
+
+    def getOptionNames(self) -> list[str]:
+        return self.oscOptions + self.ricohOptions
+
+    def getOptionDependents(self) -> dict:
+        return {**self.oscOptionDependents, **self.ricohOptionDependents}
+
+    def getVolatileOptions(self) -> list[str]:
+        return self.oscVolatileOptions + self.ricohVolatileOptions
+
+    # 'image', '_video'
+    async def setCaptureMode(self, mode) -> dict | None:
+        return await self.setOption("captureMode", mode)
+
+    async def getCaptureMode(self) -> str | None:
+        return await self.getOption("captureMode")
+
+    async def listAll(self, entryCount: int = 3, detail: bool = False, sortType: str = "newest") -> dict | None:
+        """
+        See `theta.RicohThetaS.listAll`.
+
+        Reference:
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._list_all.html
+        """
+        return await self._execute("camera._listAll",
+                                   {"entryCount": entryCount, "detail": detail, "sort": sortType})
+
+    async def deleteAll(self) -> None:
+        """
+        Delete all images and videos from the camera.
+        """
+        entryCount = (await self.listAll())['results']['totalEntries']
+        entries = (await self.listAll(entryCount))['results']['entries']
+        for entry in entries:
+            await self.delete(entry['uri'])
+            await asyncio.sleep(0.5)  # Allow time for deletion to complete
+
+    async def finishWlan(self) -> dict | None:
+        """
+        Turns the wireless LAN off.
+
+        Reference:
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._finish_wlan.html
+        """
+        return await self._execute("camera._finishWlan", {"sessionId": self.sid})
+
+    async def startCapture(self) -> dict | None:
+        """
+        Begin video capture if the captureMode is _video.  If the
+        captureMode is set to image, the camera will take multiple
+        still images.
+
+        Reference:
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._start_capture.html
+        """
+        return await self._execute("camera._startCapture", {"sessionId": self.sid})
+
+    async def stopCapture(self) -> dict | None:
+        """
+        Stop video capture.  If in image mode, will stop
+        automatic image taking.
+
+        Reference:
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._stop_capture.html
+        """
+        return await self._execute("camera._stopCapture", {"sessionId": self.sid})
+
+    async def takeVideo(self, timeLimitSeconds: int = 3) -> None:
+        """
+        Start video capture, wait for a specified time, and stop
+        video capture.
+        """
+        await self.setCaptureMode( '_video' )
+        await self.startCapture()
+        await asyncio.sleep(timeLimitSeconds)
+        await self.stopCapture()
+
+    def _downloadPayload(self, fileUri: str) -> dict:
+        """
+        Videos are transferred with camera._getVideo.
+        """
+        if fileUri.lower().endswith(".mp4"):
+            return {"name": "camera._getVideo",
+                    "parameters": {"fileUri": fileUri, "type": "full"}}
+        return AsyncOpenSphericalCamera._downloadPayload(self, fileUri)
+
+    async def getVideo(self, fileUri: str, imageType: str = "full", dir: str = './',
+                       chunkSize: int = 1 << 20) -> bool:
+        """
+        Transfer the video file from the camera to computer and save the
+        binary data to local storage.
+
+        Reference:
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._get_video.html
+        """
+        if not fileUri:
+            return False
+        d = dir + ('/' if not dir.endswith('/') else '')
+        payload = {"name": "camera._getVideo",
+                   "parameters": {"fileUri": fileUri, "type": imageType}}
+        return await self._saveStream(payload, d + localFileName(fileUri), chunkSize)
+
+    async def getLatestVideo(self, imageType: str = "full") -> None:
+        fileUri = await self.latestFileUri()
+        if fileUri:
+            await self.getVideo(fileUri, imageType)
+
+    async def livePreview(self, chunkSize: int = 8192) -> AsyncIterator[bytes]:
+        """
+        Yield the JPEG frames of the live preview until the loop over them
+        is left. The capture mode must be 'image'.
+
+        Reference:
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._get_live_preview.html
+        """
+        url = self._request("commands/execute")
+        payload = {"name": "camera._getLivePreview", "parameters": {"sessionId": self.sid}}
+        header = {"Content-Type": "application/json; charset=UTF-8",
+                  "X-Content-Type-Options": "nosniff",
+                  "X-XSRF-Protected": '1'}
+        demuxer = MjpegDemuxer()
+        try:
+            async with self._session.post(url, data=json.dumps(payload), headers=header) as response:
+                if response.status != 200:
+                    await self._oscError(response)
+                    return
+                async for chunk in response.content.iter_chunked(chunkSize):
+                    for frame in demuxer.feed(chunk):
+                        yield bytes(frame)
+        except Exception as e:
+            self._httpError(e)
+
+# AsyncRicohThetaS
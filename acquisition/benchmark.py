@@ -0,0 +1,353 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    benchmark.py                                       :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/25 16:12:09 by abrar             #+#    #+#              #
+#    Updated: 2024/09/25 16:12:09 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Benchmarks of the acquisition hot paths, run against the local simulated
+camera and the frames bundled in the repository:
+- round-trip latency of the commands
+- overhead of the status polling after a capture
+- download throughput by chunk size and concurrency
+- MJPEG demuxing rate
+- lens rearrangement rate
+- disk write throughput of the live preview
+
+The results are printed and saved as JSON, to compare them across releases:
+
+    python3 acquisition/benchmark.py --output bench.json
+
+Some results are also checked, e.g. that a kept-alive connection is not
+more than 10% slower than a new one per request, which would mean that the
+transport and not the client is measured. The script exits with an error if a check fails.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import cv2
+import numpy as np
+
+import theta
+from image_processor import rearrange_lenses, rearrange_lenses_batch, split_image
+from mjpeg import MjpegDemuxer
+from preview import LivePreviewPipeline
+from simulator import Simulator
+
+
+_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+_livePreview = os.path.join(_root, 'projection', 'livePreview')
+_largeFrames = os.path.join(_root, 'acquisition', 'time', 'frames_back')
+
+# Kept-alive requests may be this many times slower than new connections
+# before the transport is considered stalled
+_keepAliveTolerance = 1.1
+
+
+def _load(directory: str, limit: int | None = None) -> list[bytes]:
+    files = sorted(glob.glob(os.path.join(directory, '*.jpg')))[:limit]
+    return [data for data in (open(path, 'rb').read() for path in files) if data]
+
+
+def _stats(samples: list[float]) -> dict:
+    """
+    Summary in milliseconds of a list of durations in seconds.
+    """
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": 1e3 * statistics.fmean(samples),
+        "median_ms": 1e3 * statistics.median(samples),
+        "p90_ms": 1e3 * samples[min(len(samples) - 1, int(0.9 * len(samples)))],
+        "max_ms": 1e3 * samples[-1],
+    }
+
+
+def _rate(function: Callable, count: int, minTime: float = 0.5) -> float:
+    """
+    Number of items per second processed by function, which handles count
+    items per call. The function is repeated for at least minTime seconds.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime:
+            return calls * count / elapsed
+
+
+def bench_commands(camera: theta.RicohThetaS, repeat: int) -> dict:
+    """
+    Round-trip latency of the main commands.
+    """
+    results = {}
+    for name, command in (("info", lambda: camera.info(refresh=True)),
+                          ("state", camera.state),
+                          ("getOptions", lambda: (camera.invalidateOptions(),
+                                                  camera.getOptions(["iso", "captureMode"]))),
+                          ("listAll", lambda: camera.listAll(10))):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            command()
+            samples.append(time.perf_counter() - start)
+        results[name] = _stats(samples)
+    return results
+
+
+def bench_keepalive(host: str, port: int, repeat: int) -> dict:
+    """
+    Round-trip latency of the state command through kept-alive connections
+    and through a new connection per request.
+    """
+    results = {}
+    for name, keepAlive in (("keep_alive", True), ("new_connection", False)):
+        camera = theta.RicohThetaS(host, port, keepAlive=keepAlive)
+        camera.state()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            camera.state()
+            samples.append(time.perf_counter() - start)
+        camera.close()
+        results[name] = _stats(samples)
+    return results
+
+
+def bench_polling(camera: theta.RicohThetaS, processingTime: float, repeat: int) -> dict:
+    """
+    Time between the end of the processing of a picture on the camera and
+    the moment waitForProcessing returns, polling the status or the state
+    fingerprint.
+    """
+    camera.setCaptureMode("image")
+    results = {}
+    for name, useUpdates in (("status", False), ("updates", True)):
+        overheads = []
+        polls = []
+        timeouts = 0
+        for _ in range(repeat):
+            response = camera.takePicture()
+            start = time.perf_counter()
+            count = 0
+            commandStatus = camera.commandStatus
+
+            def counted(command_id: str) -> dict | None:
+                nonlocal count
+                count += 1
+                return commandStatus(command_id)
+
+            camera.commandStatus = counted
+            status = camera.waitForProcessing(response['id'], maxWait=processingTime + 5.0,
+                                              useUpdates=useUpdates)
+            del camera.commandStatus
+            if status is None:
+                timeouts += 1
+            overheads.append(time.perf_counter() - start - processingTime)
+            polls.append(count)
+        results[name] = {"overhead": _stats(overheads), "polls_mean": statistics.fmean(polls),
+                         "timeouts": timeouts}
+    return results
+
+
+def bench_downloads(camera: theta.RicohThetaS, files: int, chunkSizes: list[int],
+                    workers: list[int]) -> list[dict]:
+    """
+    Download throughput in MB/s by chunk size and number of workers.
+    """
+    camera.setCaptureMode("image")
+    commands = [camera.takePicture() for _ in range(files)]
+    for response in commands:
+        camera.waitForProcessing(response['id'])
+    entries = camera.listAll(files)['results']['entries']
+    total = sum(entry['size'] for entry in entries)
+
+    results = []
+    for chunkSize in chunkSizes:
+        for count in workers:
+            directory = tempfile.mkdtemp()
+            start = time.perf_counter()
+            camera.downloadFiles(entries, directory, workers=count, chunkSize=chunkSize)
+            elapsed = time.perf_counter() - start
+            shutil.rmtree(directory)
+            results.append({"chunk_size": chunkSize, "workers": count,
+                            "MB_per_s": total / elapsed / 1e6, "files_per_s": len(entries) / elapsed})
+    return results
+
+
+def bench_demux(frames: list[bytes], chunkSizes: list[int]) -> list[dict]:
+    """
+    Frames per second extracted by MjpegDemuxer from an in-memory stream.
+    """
+    stream = b''.join(b'---osclivepreview---\r\nContent-type: image/jpeg\r\n'
+                      b'Content-Length: %d\r\n\r\n' % len(jpg) + jpg + b'\r\n' for jpg in frames)
+    results = []
+    for chunkSize in chunkSizes:
+        chunks = [stream[i:i + chunkSize] for i in range(0, len(stream), chunkSize)]
+
+        def demux() -> None:
+            demuxer = MjpegDemuxer()
+            for chunk in chunks:
+                for _ in demuxer.feed(chunk):
+                    pass
+
+        results.append({"chunk_size": chunkSize, "frames_per_s": _rate(demux, len(frames))})
+    return results
+
+
+def bench_rearrange(frames: list[bytes]) -> dict:
+    """
+    Frames per second of the lens rearrangement, compared with the former
+    split_image and hconcat sequence.
+
+    The former sequence, the rearrangement allocating its views and the
+    batch into preallocated stacks all keep the views of every frame. The
+    rearrangement into a single pair of reused buffers, as in the live
+    preview, is the streaming case where the views are consumed at once.
+    """
+    images = [cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR) for jpg in frames]
+
+    def legacy() -> list:
+        views = []
+        for img in images:
+            back_img, front_img = split_image(img)
+            back_back_img, front_back_img = split_image(back_img)
+            back_front_img, front_front_img = split_image(front_img)
+            views.append((cv2.hconcat([front_back_img, back_front_img]),
+                          cv2.hconcat([front_front_img, back_back_img])))
+        return views
+
+    def allocating() -> list:
+        return [rearrange_lenses(img) for img in images]
+
+    back, front = rearrange_lenses(images[0])
+    back, front = np.empty_like(back), np.empty_like(front)
+
+    def reused() -> None:
+        for img in images:
+            rearrange_lenses(img, back, front)
+
+    stack = np.stack(images)
+    _, fronts = rearrange_lenses_batch(stack)
+
+    return {
+        "shape": list(images[0].shape),
+        "split_hconcat_frames_per_s": _rate(legacy, len(images)),
+        "rearrange_frames_per_s": _rate(allocating, len(images)),
+        "rearrange_batch_frames_per_s": _rate(lambda: rearrange_lenses_batch(stack, front=fronts), len(images)),
+        "rearrange_reused_frames_per_s": _rate(reused, len(images)),
+    }
+
+
+def bench_disk(frames: list[bytes]) -> dict:
+    """
+    Throughput of the raw frame writes, and of the live preview pipeline
+    replaying a stream without display.
+    """
+    directory = tempfile.mkdtemp()
+    total = sum(len(jpg) for jpg in frames)
+    start = time.perf_counter()
+    for i, jpg in enumerate(frames):
+        with open(os.path.join(directory, f"frame{i}.jpg"), 'wb') as handle:
+            handle.write(jpg)
+    elapsed = time.perf_counter() - start
+    results = {"write_MB_per_s": total / elapsed / 1e6, "write_frames_per_s": len(frames) / elapsed}
+
+    stream = b''.join(b'--b\r\nContent-Length: %d\r\n\r\n' % len(jpg) + jpg + b'\r\n' for jpg in frames)
+    for rearrange in (False, True):
+        pipeline = LivePreviewPipeline(directory + '/', queueSize=len(frames), dropOldest=False,
+                                       display=False, rearrange=rearrange)
+        start = time.perf_counter()
+        pipeline.run(stream[i:i + 65536] for i in range(0, len(stream), 65536))
+        elapsed = time.perf_counter() - start
+        key = "pipeline_rearranged_frames_per_s" if rearrange else "pipeline_raw_frames_per_s"
+        results[key] = len(frames) / elapsed
+    shutil.rmtree(directory)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the acquisition code against a simulated camera.')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='JSON file to write the results to.')
+    parser.add_argument('--latency', type=float, default=0.005, help='Latency in seconds of the simulated camera.')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='Bandwidth in bytes per second of the simulated camera, 0 for no limit.')
+    parser.add_argument('--processing-time', type=float, default=0.5, help='Processing time of a picture on the simulated camera.')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of repetitions of the command measurements.')
+    parser.add_argument('--files', type=int, default=20, help='Number of files downloaded per download measurement.')
+    args = parser.parse_args()
+
+    previewFrames = _load(_livePreview)
+    largeFrames = _load(_largeFrames, 10)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "simulator": {"latency": args.latency, "bandwidth": args.bandwidth,
+                      "processing_time": args.processing_time},
+    }
+
+    with Simulator(latency=args.latency, bandwidth=args.bandwidth,
+                   processingTime=args.processing_time) as simulator:
+        camera = theta.RicohThetaS(simulator.host, simulator.port, poolSize=8)
+        print("Connections...")
+        results["keepalive"] = bench_keepalive(simulator.host, simulator.port, args.repeat)
+        print("Commands...")
+        results["commands"] = bench_commands(camera, args.repeat)
+        print("Status polling...")
+        results["polling"] = bench_polling(camera, args.processing_time, max(1, args.repeat // 4))
+        print("Downloads...")
+        results["downloads"] = bench_downloads(camera, args.files, [1024, 65536, 1 << 20], [1, 4, 8])
+        camera.closeSession()
+        camera.close()
+
+    print("MJPEG demuxing...")
+    results["demux"] = bench_demux(previewFrames, [1024, 8192, 65536])
+    print("Lens rearrangement...")
+    results["rearrange"] = {"preview": bench_rearrange(previewFrames)}
+    if largeFrames:
+        results["rearrange"]["large"] = bench_rearrange(largeFrames)
+    print("Disk writes...")
+    results["disk"] = bench_disk(previewFrames)
+
+    keepalive = results["keepalive"]
+    results["checks"] = {
+        # A slower kept-alive connection means a stall in the transport,
+        # e.g. Nagle's algorithm, which then dominates every command. Both
+        # are close on loopback, the tolerance absorbs the scheduling noise
+        "keep_alive_not_slower": keepalive["keep_alive"]["median_ms"] <= _keepAliveTolerance * keepalive["new_connection"]["median_ms"],
+        "polling_without_timeout": all(mode["timeouts"] == 0 for mode in results["polling"].values()),
+    }
+
+    print(json.dumps(results, indent=2))
+    with open(args.output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"Results written to {args.output}")
+
+    failed = [name for name, passed in results["checks"].items() if not passed]
+    if failed:
+        print(f"Check(s) failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
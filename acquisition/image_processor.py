@@ -15,11 +15,13 @@
 Script to read and split images using OpenCV
 
 This script demonstrates how to read images, split them into left and right halves, 
-display the processed images.
+display the processed images. It also rearranges frames into the back and front
+views of the two lenses.
 """
 
 import os
 import cv2 
+import numpy as np
 from typing import Tuple
 
 
@@ -42,6 +44,91 @@ def split_image(img: cv2.Mat) -> Tuple[cv2.Mat, cv2.Mat]:
     return left_part, right_part
 
 
+def lens_bounds(width: int) -> Tuple[int, int]:
+    """
+    Columns delimiting the back view in a frame of the given width.
+
+    The back view is made of the second and third quarters of the frame
+    and the front view of the fourth and first quarters, as obtained by
+    splitting the frame and then each of its halves with `split_image`.
+
+    Parameters
+    ----------
+    width: int, width of the frame.
+
+    Returns
+    -------
+    The first and last (excluded) columns of the back view.
+    """
+    half = width // 2
+    return half // 2, half + (width - half) // 2
+
+
+def rearrange_lenses(img: np.ndarray, back: np.ndarray | None = None, front: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the back and front views of a frame in one pass.
+
+    The back view is a contiguous range of columns and is returned as a view
+    on the frame unless a `back` buffer is given. The front view wraps around
+    the frame and is written into the `front` buffer, allocated if needed.
+
+    Parameters
+    ----------
+    img : The frame matrix.
+    back : Optional preallocated output for the back view.
+    front : Optional preallocated output for the front view.
+
+    Returns
+    -------
+    The back and front views.
+    """
+    a, c = lens_bounds(img.shape[1])
+    if back is None:
+        back = img[:, a:c]
+    else:
+        np.copyto(back, img[:, a:c])
+    if front is None:
+        front = np.empty((img.shape[0], img.shape[1] - (c - a)) + img.shape[2:], dtype=img.dtype)
+    front[:, :img.shape[1] - c] = img[:, c:]
+    front[:, img.shape[1] - c:] = img[:, :a]
+    return back, front
+
+
+def rearrange_lenses_batch(frames, back: np.ndarray | None = None, front: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build the back and front views of many frames of the same size into
+    stacks of views.
+
+    The frames are rearranged one after the other, so that each copy works
+    on a single frame that stays in cache, into the preallocated stacks.
+
+    Parameters
+    ----------
+    frames : Sequence of frames, or array of shape (count, height, width[, channels]).
+    back : Optional preallocated stack for the back views.
+    front : Optional preallocated stack for the front views.
+
+    Returns
+    -------
+    The stacks of back and front views, of shape
+    (count, height, view_width[, channels]). When `back` is not given and
+    `frames` is an array, the back views are a view on `frames`.
+    """
+    first = frames[0]
+    a, c = lens_bounds(first.shape[1])
+    copyBack = back is not None or not isinstance(frames, np.ndarray)
+    if back is None:
+        if copyBack:
+            back = np.empty((len(frames), first.shape[0], c - a) + first.shape[2:], dtype=first.dtype)
+        else:
+            back = frames[:, :, a:c]
+    if front is None:
+        front = np.empty((len(frames), first.shape[0], first.shape[1] - (c - a)) + first.shape[2:], dtype=first.dtype)
+    for i, img in enumerate(frames):
+        rearrange_lenses(img, back[i] if copyBack else None, front[i])
+    return back, front
+
+
 def video_to_frames(video_path: str, output_dir: str):
     """
     Decompose a video into frames and save them as images.
@@ -90,19 +177,21 @@ def video_to_frames(video_path: str, output_dir: str):
 
 
 
-def main(img_name: str) -> None:
-    img = cv2.imread(img_name)
-    r,l = split_image(img)
-    cv2.imshow(f"{img_name}_r", r)
-    cv2.imshow(f"{img_name}_l", l)
-    if (cv2.waitKey(1) & 0xFF == ord('q')):
-        return
+def main(img_names: list[str]) -> None:
+    imgs = [cv2.imread(img_name) for img_name in img_names]
+    backs, fronts = rearrange_lenses_batch(imgs)
+    for img_name, back, front in zip(img_names, backs, fronts):
+        cv2.imshow(f"{img_name}_back", back)
+        cv2.imshow(f"{img_name}_front", front)
+        if (cv2.waitKey(0) & 0xFF == ord('q')):
+            break
+    cv2.destroyAllWindows()
 
 
 if __name__ == "__main__":
     # Example usage
-    # image_name = 
-    # main(image_name)
+    # image_names = 
+    # main(image_names)
     video_path = 'acquisition/time/video_front.mp4'
     output_dir = 'acquisition/time/frames_front'
     video_to_frames(video_path, output_dir)
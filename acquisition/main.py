@@ -21,39 +21,37 @@ def main() -> None:
 
     parser = argparse.ArgumentParser(description='Control Ricoh Theta S camera.')
     parser.add_argument('-ip', default='192.168.1.1', help='IP address of the camera. Default is 192.168.1.1 .')
+    parser.add_argument('--port', default=80, type=int, help='HTTP port of the camera, e.g. the one of acquisition/simulator.py. Default is 80.')
     parser.add_argument('--dir', default='./', help='Directory to save images from the live preview or on the disk. Default is the current directory.')
     parser.add_argument('-tl', '--time-limit', type=int, default=3, help='Time limit in seconds for taking video')
-    parser.add_argument('action', choices=['take_picture', 'list_all', 'get_latest_image', 'get_live_preview', 'take_video', 'get_latest_video', 'delete', 'get_latest_files'], help="Action to perform on the camera.")
+    parser.add_argument('action', choices=['info', 'take_picture', 'list_all', 'get_latest_image', 'get_live_preview', 'take_video', 'get_latest_video', 'delete', 'get_latest_files'], help="Action to perform on the camera.")
     parser.add_argument('--detail', action="store_true", help='Display detailed information.')
     parser.add_argument('-n', default=3, type=int, help='Number of file to display/save')
+    parser.add_argument('-j', '--jobs', default=4, type=int, help='Number of files downloaded concurrently. Default is 4.')
     parser.add_argument('--uri', help="URI to delete on the disk of the camera. The 'list_all' action return informations containing files' URI.")
     parser.add_argument('--all', action="store_true", help="Option to delete all the files on the disk of the camera.")
+    parser.add_argument('--headless', action="store_true", help="Live preview without any window. Frames are saved as received unless --rearrange is given.")
+    parser.add_argument('--rearrange', action="store_true", help="With --headless, also save the front and back views of the live preview.")
     args = parser.parse_args()
-    thetas = theta.RicohThetaS(args.ip)
+    thetas = theta.RicohThetaS(args.ip, args.port, poolSize=max(4, args.jobs))
 
     if not os.path.exists(f"{args.dir}"):
         print(f"Error: Creating directory of {args.dir}")
         os.makedirs(f"{args.dir}")
 
-    print(60 * "=")
-    print("Getting basic info...")
-    pprint.pprint(thetas.info())
-
-    print(60 * "=")
-    print("Getting state...")
-    pprint.pprint(thetas.state())
-
-    print(60 * "=")
-    print("Starting session...")
-    thetas.startSession()
-    print("Session started.")
-
+    # The camera info is retrieved and the session started by the first
+    # command which needs them
     print(60 * "=")
     match args.action:
         case 'take_picture':
             thetas.setCaptureMode('image')
             print("Taking picture...")
             thetas.takePicture()
+        case 'info':
+            print("Getting basic info...")
+            pprint.pprint(thetas.info())
+            print("Getting state...")
+            pprint.pprint(thetas.state())
         case 'list_all':
             print("Listing files...")
             images = thetas.listAll(args.n, args.detail) if args.detail else thetas.listAll(args.n)
@@ -65,7 +63,8 @@ def main() -> None:
             thetas.setCaptureMode('image')
             print("Getting live preview...")
             dir = args.dir + ('/' if not args.dir.endswith('/') else '')
-            thetas.getLivePreview(dir = dir)
+            thetas.getLivePreview(dir = dir, headless = args.headless,
+                                  rearrange = args.rearrange or not args.headless)
         case 'take_video':
             print("Taking video...")
             thetas.takeVideo(args.time_limit)
@@ -86,8 +85,7 @@ def main() -> None:
         case 'get_latest_files':
             entries = thetas.listAll(args.n)['results']['entries']
             print("Getting latest files...")
-            for entry in entries:
-                thetas.getImage(entry['uri'], dir=args.dir)
+            thetas.downloadFiles(entries, dir=args.dir, workers=args.jobs)
         
     
     print(60 * "=")
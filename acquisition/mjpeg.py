@@ -0,0 +1,137 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    mjpeg.py                                           :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/16 10:12:41 by abrar             #+#    #+#              #
+#    Updated: 2024/09/16 10:12:41 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Incremental demuxer for the MJPEG stream sent by `camera._getLivePreview`.
+
+The stream is a multipart/x-mixed-replace body whose parts are JPEG images,
+usually preceded by a small header containing their Content-Length.
+Chunks are appended to a reusable buffer and the scan resumes where it
+stopped, so each byte of the stream is inspected once.
+"""
+
+import re
+from typing import Iterable, Iterator
+
+
+__all__ = ['MjpegDemuxer', 'iter_frames']
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+_contentLength = re.compile(rb'content-length\s*:\s*(\d+)', re.IGNORECASE)
+
+# Bytes kept before a start of image marker when no frame is in progress,
+# enough for the part header
+_maxHeaderSize = 4096
+
+
+class MjpegDemuxer:
+    """
+    Split a byte stream into JPEG frames.
+
+    Frames are returned as memoryviews on the internal buffer, they are only
+    valid until the next call to `feed`. Copy them with `bytes()` to keep them.
+    """
+
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0         # First byte not consumed yet
+        self._end = 0           # End of the valid data
+        self._scan = 0          # Where the next marker search resumes
+        self._frameStart = -1   # Start of image of the current frame
+        self._frameEnd = -1     # End of the current frame, when known
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def _append(self, chunk: bytes) -> None:
+        size = len(chunk)
+        if self._end + size > len(self._buf):
+            pending = self._end - self._start
+            if pending + size > len(self._buf):
+                # Grow into a new buffer, views already returned stay valid
+                buf = bytearray(max(2 * len(self._buf), pending + size))
+                buf[:pending] = self._view[self._start:self._end]
+                self._buf = buf
+                self._view = memoryview(buf)
+            else:
+                # Move the pending bytes back to the beginning, in place
+                self._view[:pending] = self._view[self._start:self._end]
+            offset = self._start
+            self._start = 0
+            self._end = pending
+            self._scan -= offset
+            if self._frameStart >= 0:
+                self._frameStart -= offset
+            if self._frameEnd >= 0:
+                self._frameEnd -= offset
+        self._buf[self._end:self._end + size] = chunk
+        self._end += size
+
+    def _frames(self) -> Iterator[memoryview]:
+        buf = self._buf
+        while True:
+            if self._frameStart < 0:
+                soi = buf.find(SOI, self._scan, self._end)
+                if soi == -1:
+                    # Keep the last byte, it may be the first half of a marker
+                    self._scan = max(self._start, self._end - 1)
+                    if self._end - self._start > _maxHeaderSize:
+                        self._start = self._scan
+                    return
+                # Use the header of the part to know where the frame ends
+                length = 0
+                for match in _contentLength.finditer(buf, self._start, soi):
+                    length = int(match.group(1))
+                self._frameStart = soi
+                self._frameEnd = soi + length if length else -1
+                self._scan = soi + 2
+
+            if self._frameEnd < 0:
+                eoi = buf.find(EOI, self._scan, self._end)
+                if eoi == -1:
+                    self._scan = max(self._frameStart + 2, self._end - 1)
+                    return
+                self._frameEnd = eoi + 2
+            elif self._frameEnd > self._end:
+                return
+
+            frame = self._view[self._frameStart:self._frameEnd]
+            self._start = self._scan = self._frameEnd
+            self._frameStart = self._frameEnd = -1
+            yield frame
+
+    def feed(self, chunk: bytes) -> Iterator[memoryview]:
+        """
+        Append a chunk of the stream and return the frames it completes.
+        """
+        self._append(chunk)
+        return self._frames()
+
+    def reset(self) -> None:
+        """
+        Drop any partial frame, e.g. after reconnecting to the camera.
+        """
+        self._start = self._end = self._scan = 0
+        self._frameStart = self._frameEnd = -1
+
+
+def iter_frames(chunks: Iterable[bytes], demuxer: MjpegDemuxer | None = None) -> Iterator[memoryview]:
+    """
+    Yield the JPEG frames contained in a stream of chunks, e.g.
+    `response.iter_content(chunkSize)`.
+    """
+    demuxer = demuxer if demuxer is not None else MjpegDemuxer()
+    for chunk in chunks:
+        yield from demuxer.feed(chunk)
@@ -20,13 +20,18 @@ Python and a camera that supports the Open Spherical Camera API.
 """
 
 import json
+import os
 import requests
+import statistics
+import sys
+from requests.adapters import HTTPAdapter
 import time
 import pprint
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
-__all__ = ['g_oscOptions', 'shutterSpeedNames', 'shutterSpeeds',
-           'exposurePrograms', 'whiteBalance', 'OpenSphericalCamera']
+__all__ = ['g_oscOptions', 'g_oscOptionDependents', 'g_oscVolatileOptions', 'shutterSpeedNames', 'shutterSpeeds',
+           'exposurePrograms', 'whiteBalance', 'localFileName', 'OpenSphericalCamera']
 
 #
 # Options
@@ -54,6 +59,24 @@ g_oscOptions = [
             "imageStabilization", "imageStabilizationSupport", "wifiPassword"
             ]
 
+#
+# Options whose value the camera may change when another one is set. They
+# are evicted from the option cache with it, None standing for every option.
+#
+g_oscOptionDependents = {
+            "captureMode": None,
+            "exposureProgram": ["aperture", "iso", "shutterSpeed"],
+            "aperture": ["exposureProgram"],
+            "iso": ["exposureProgram"],
+            "shutterSpeed": ["exposureProgram"]
+            }
+
+#
+# Read-only options which change with every capture or deletion, they are
+# never kept in the option cache.
+#
+g_oscVolatileOptions = ["remainingPictures", "remainingSpace", "totalSpace"]
+
 #
 # Known options values
 #
@@ -120,36 +143,90 @@ serviceUnavailable      - 503 - Processing requests cannot be received temporari
 unexpected              - 503 - Other errors
 '''
 
+def localFileName(fileUri: str) -> str:
+    """
+    Name of the local copy of a file of the camera, the last part of its
+    fileUri, e.g. 'R0010001.JPG' for '100RICOH/R0010001.JPG'.
+    """
+    return fileUri.split("/")[-1]
+
 #
 # Generic OpenSphericalCamera
 #
 class OpenSphericalCamera:
     # Class variables / methods
     oscOptions = g_oscOptions
+    oscOptionDependents = g_oscOptionDependents
+    oscVolatileOptions = g_oscVolatileOptions
 
     # Instance variables / methods
-    def __init__(self, ip_base: str = "192.168.1.1", httpPort: int = 80) -> None:
+    def __init__(self, ip_base: str = "192.168.1.1", httpPort: int = 80,
+                 poolSize: int = 4, timeout: float | tuple[float, float] = (5.0, 30.0),
+                 keepAlive: bool = True) -> None:
+        """
+        poolSize:
+                Integer Maximum number of connections kept open to the camera.
+                Concurrent callers beyond this number wait for a free one.
+        timeout:
+                Float or (connect, read) tuple in seconds applied to every
+                request that does not provide its own.
+        keepAlive:
+                Boolean Whether connections are reused between commands.
+        """
         self.sid = None
         self.fingerprint = None
+        self.processingTimes = []
+        self._options = {}
         self._api = None
 
         self._ip = ip_base
         self._httpPort = httpPort
         self._httpUpdatesPort = httpPort
 
-        # Try to start a session
-        self.startSession()
+        # Persistent connection pool shared by every command, so that polling
+        # and bulk transfers do not pay a TCP handshake per request
+        self._timeout = timeout
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=1,
+                                                  pool_maxsize=poolSize,
+                                                  pool_block=True))
+        if not keepAlive:
+            self._session.headers["Connection"] = "close"
+
+        # Nothing is sent to the camera yet: the info is retrieved and the
+        # session started on first need, or explicitly with connect()
+        self._info = None
+
+    def connect(self) -> bool:
+        """
+        Retrieve the camera info and start a session right away, instead of
+        on the first command which needs them. Returns whether the camera
+        answered.
+        """
+        return self.info() is not None and self._sessionId() is not None
 
-        # Use 'info' command to retrieve more information
-        self._info = self.info()
-        if self._info:
-            self._api = self._info['api']
-            self._httpPort = self._info['endpoints']['httpPort']
-            self._httpUpdatesPort = self._info['endpoints']['httpUpdatesPort']
+    def _sessionId(self) -> (str | None):
+        """
+        Id of the current session, started on first need.
+        """
+        if self.sid is None:
+            self.startSession()
+        return self.sid
 
     def __del__(self) -> None:
-        if self.sid:
+        # At interpreter exit the connection pool may already be torn down
+        # and a request would wait forever for a free connection
+        if getattr(self, 'sid', None) and not sys.is_finalizing():
             self.closeSession()
+        self.close()
+
+    def close(self) -> None:
+        """
+        Release the pooled connections to the camera.
+        """
+        session = getattr(self, '_session', None)
+        if session is not None:
+            session.close()
 
     def _request(self, url_request: str, update: bool = False) -> str:
         """
@@ -172,6 +249,20 @@ class OpenSphericalCamera:
 
         return url
 
+    def _post(self, url: str, **kwargs) -> requests.Response:
+        """
+        POST through the pooled transport with the default timeout.
+        """
+        kwargs.setdefault('timeout', self._timeout)
+        return self._session.post(url, **kwargs)
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """
+        GET through the pooled transport with the default timeout.
+        """
+        kwargs.setdefault('timeout', self._timeout)
+        return self._session.get(url, **kwargs)
+
     def _httpError(self, exception) -> None:
         print( "HTTP Error - begin" )
         print( repr(exception) )
@@ -187,6 +278,10 @@ class OpenSphericalCamera:
             if 'error' in error:
                 print( "OSC Error - Code        : %s" % error['error']['code'])
                 print( "OSC Error - Message     : %s" % error['error']['message'])
+                # The session expired, it has to be started again
+                if error['error']['code'] == "invalidSessionId":
+                    self.sid = None
+                    self.invalidateOptions()
             print( "OSC Error - Name        : %s" % error['name'])
             print( "OSC Error - State       : %s" % error['state'])
         except:
@@ -196,24 +291,41 @@ class OpenSphericalCamera:
 
     def getOptionNames(self) -> list[str]:
         return self.oscOptions
+
+    def getOptionDependents(self) -> dict:
+        return self.oscOptionDependents
+
+    def getVolatileOptions(self) -> list[str]:
+        return self.oscVolatileOptions
     
-    def info(self) -> (dict | None):
+    def info(self, refresh: bool = False) -> (dict | None):
         """
         Get basic information on the camera.  Note that this is a GET call
         and not a POST.  Most of the calls are POST.
 
+        The information does not change, it is only retrieved once unless
+        refresh is set. The supported API and ports it gives are used by
+        the following requests.
+
         Reference:
         https://developers.google.com/streetview/open-spherical-camera/guides/osc/info
         """
+        if self._info is not None and not refresh:
+            return self._info
+
         url = self._request("info")
         try:
-            req = requests.get(url)
+            req = self._get(url)
         except Exception as e:
             self._httpError(e)
             return None
 
         if req.status_code == 200:
             response = req.json()
+            self._info = response
+            self._api = response['api']
+            self._httpPort = response['endpoints']['httpPort']
+            self._httpUpdatesPort = response['endpoints']['httpUpdatesPort']
         else:
             self._oscError(req)
             response = None
@@ -229,7 +341,7 @@ class OpenSphericalCamera:
         """
         url = self._request("state")
         try:
-            req = requests.post(url)
+            req = self._post(url)
         except Exception as e:
             self._httpError(e)
             return None
@@ -247,6 +359,17 @@ class OpenSphericalCamera:
         """
         Returns the status for previous inProgress commands.
 
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/guides/osc/commands/status
+        """
+        response = self.commandStatus(command_id)
+        return response['state'] if response else None
+
+    def commandStatus(self, command_id: str) -> (dict | None):
+        """
+        Returns the whole status response for previous inProgress commands,
+        including the 'results' of the commands which are done.
+
         Reference:
         https://developers.google.com/streetview/open-spherical-camera/guides/osc/commands/status
         """
@@ -256,23 +379,26 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
 
         if req.status_code == 200:
             response = req.json()
-            state = response['state']
         else:
             self._oscError(req)
-            state = None
-        return state
+            response = None
+        return response
 
-    def checkForUpdates(self) -> bool:
+    def checkForUpdates(self, invalidate: bool = True) -> bool:
         """
         Check for updates on the camera, using the current state fingerprint.
 
+        invalidate:
+                Boolean Forget the cached options when the state changed,
+                as they may have been changed by someone else.
+
         Reference:
         https://developers.google.com/streetview/open-spherical-camera/guides/osc/checkforupdates
         """
@@ -285,7 +411,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return False
@@ -296,6 +422,8 @@ class OpenSphericalCamera:
             if newFingerprint != self.fingerprint:
                 print( "Update - new, old fingerprint : %s, %s" % (newFingerprint, self.fingerprint) )
                 self.fingerprint = newFingerprint
+                if invalidate:
+                    self.invalidateOptions()
                 response = True
             else:
                 print( "No update - fingerprint : %s" % self.fingerprint )
@@ -305,28 +433,83 @@ class OpenSphericalCamera:
             response = False
         return response
 
-    def waitForProcessing(self, command_id: str, maxWait: int = 20) -> None:
+    def waitForProcessing(self, command_id: str, maxWait: float = 20, firstDelay: float = 0.05,
+                          maxDelay: float = 0.25, backoff: float = 2.0,
+                          useUpdates: bool = False) -> (dict | None):
         """
         Helper function that will poll the camera until the status to changes 
         to 'done' or the timeout is hit.
 
+        maxWait:
+                Float Deadline in seconds for the whole wait.
+        firstDelay:
+                Float Delay in seconds after the first poll. It is multiplied
+                by backoff after each poll, up to maxDelay.
+        maxDelay:
+                Float Longest delay in seconds between two polls, which is
+                also how late the end of the processing may be noticed. A
+                longer one saves requests on long processings.
+        useUpdates:
+                Boolean Poll checkForUpdates and only query the status once
+                the state fingerprint changes. The status is still queried
+                once at the start, in case the command is already done.
+
+        Returns the final status response, whose 'results' hold e.g. the
+        fileUri, or None if the deadline is hit. The processing times are
+        kept in processingTimes, see processingStats.
+
         Reference:
         https://developers.google.com/streetview/open-spherical-camera/guides/osc/commands/status
         """
 
         print( "Waiting for processing")
-        for i in range(maxWait):
-            status = self.status(command_id)
-            if status == "done":
-                print( "Image processing finished" )
-                break
-            elif not status or "error" in status:
-                print( "Status failed. Stopping wait." )
-                break
-            print( "%d - %s" % (i, status) )
-            time.sleep( 1 )
-
-        return
+        start = time.monotonic()
+        deadline = start + maxWait
+        delay = firstDelay
+        i = 0
+        if useUpdates:
+            # Reference fingerprint of the wait, the command itself may have
+            # changed the state since the last one seen
+            self.state()
+        while True:
+            # The state changes of a capture are not option changes, the
+            # option cache is kept
+            if not useUpdates or i == 0 or self.checkForUpdates(invalidate=False):
+                response = self.commandStatus(command_id)
+                status = response['state'] if response else None
+                if status == "done":
+                    self.processingTimes.append(time.monotonic() - start)
+                    print( "Image processing finished" )
+                    return response
+                elif not status or "error" in status:
+                    print( "Status failed. Stopping wait." )
+                    return response
+                print( "%d - %s" % (i, status) )
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print( "Processing not finished after %s seconds. Stopping wait." % maxWait )
+                return None
+            time.sleep( min(delay, remaining) )
+            delay = min(delay * backoff, maxDelay)
+            i += 1
+
+    def processingStats(self) -> (dict | None):
+        """
+        Distribution of the processing times observed by waitForProcessing,
+        in seconds.
+        """
+        if not self.processingTimes:
+            return None
+        times = sorted(self.processingTimes)
+        return {
+            "count": len(times),
+            "mean": statistics.fmean(times),
+            "min": times[0],
+            "median": statistics.median(times),
+            "p90": times[min(len(times) - 1, int(0.9 * len(times)))],
+            "max": times[-1],
+        }
 
     def startSession(self) -> (str | None):
         """
@@ -344,7 +527,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             self.sid = None
@@ -353,6 +536,8 @@ class OpenSphericalCamera:
         if req.status_code == 200:
             response = req.json()
             self.sid = (response["results"]["sessionId"])
+            # The option cache is scoped to the session
+            self.invalidateOptions()
         else:
             self._oscError(req)
             self.sid = None
@@ -367,13 +552,13 @@ class OpenSphericalCamera:
         """
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera.updateSession",
-             "parameters": { "sessionId":self.sid }
+             "parameters": { "sessionId":self._sessionId() }
              })
         header = {"Content-Type": "application/json; charset=UTF-8", 
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -389,11 +574,13 @@ class OpenSphericalCamera:
 
     def closeSession(self) -> (dict | None):
         """
-        Close a session.
+        Close a session. Nothing is sent when no session was started.
 
         Reference:
         https://developers.google.com/streetview/open-spherical-camera/reference/camera/closesession
         """
+        if self.sid is None:
+            return None
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera.closeSession",
              "parameters": { "sessionId":self.sid }
@@ -402,7 +589,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -410,6 +597,7 @@ class OpenSphericalCamera:
         if req.status_code == 200:
             response = req.json()
             self.sid = None
+            self.invalidateOptions()
         else:
             self._oscError(req)
             response = None
@@ -425,7 +613,7 @@ class OpenSphericalCamera:
         Reference:
         https://developers.google.com/streetview/open-spherical-camera/reference/camera/takepicture
         """
-        if self.sid == None:
+        if self._sessionId() is None:
             response = None
             return response
         url = self._request("commands/execute")
@@ -438,7 +626,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -485,7 +673,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -514,7 +702,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -526,7 +714,8 @@ class OpenSphericalCamera:
             response = None
         return response
 
-    def getImage(self, fileUri: str, imageType: str = "image", dir: str = './') -> bool:
+    def getImage(self, fileUri: str, imageType: str = "image", dir: str = './',
+                 chunkSize: int = 1 << 20) -> bool:
         """
         Transfer the file from the camera to computer and save the
         binary data to local storage.  This works, but is clunky.
@@ -548,26 +737,115 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
 
-        fileName = fileUri.split("/")[1]
+        fileName = localFileName(fileUri)
         print( "Writing image : %s" % fileName )
 
-        acquired = False
+        d = dir + ('/' if not dir.endswith('/') else '') 
+        return self._saveStream(url, body, header, d + fileName, chunkSize)
+
+    def _saveStream(self, url: str, body: str, header: dict, path: str,
+                    chunkSize: int = 1 << 20, resume: bool = True) -> bool:
+        """
+        Helper function that will stream the response of a command to a file.
+        The data is written to path + '.part', which is renamed once complete,
+        so that an interrupted transfer never leaves a truncated file. The
+        transfer of an existing '.part' file is resumed with a Range request,
+        or restarted if the camera ignores it.
+        """
+        partPath = path + '.part'
+        offset = os.path.getsize(partPath) if resume and os.path.exists(partPath) else 0
+        if offset:
+            header = dict(header, Range="bytes=%d-" % offset)
+
         try:
-            response = requests.post(url, data=body, headers=header, stream=True)
+            response = self._post(url, data=body, headers=header, stream=True)
         except Exception as e:
             self._httpError(e)
-            return acquired
-
-        if response.status_code == 200:
-            d = dir + ('/' if not dir.endswith('/') else '') 
-            with open(d + fileName, 'wb') as handle:
-                for block in response.iter_content(1024):
-                    handle.write(block)
-            acquired = True
-        else:
-            self._oscError(response)
+            return False
 
-        return acquired
+        with response:
+            if response.status_code == 416 and offset:
+                # Nothing left to transfer
+                os.replace(partPath, path)
+                return True
+            if response.status_code not in (200, 206):
+                self._oscError(response)
+                return False
+
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            try:
+                with open(partPath, mode) as handle:
+                    for block in response.iter_content(chunkSize):
+                        handle.write(block)
+            except Exception as e:
+                # Keep the partial file to resume later
+                self._httpError(e)
+                return False
+
+        os.replace(partPath, path)
+        return True
+
+    def _downloadBody(self, fileUri: str) -> str:
+        """
+        Body of the command used by downloadFiles to transfer fileUri.
+        """
+        return json.dumps({"name": "camera.getImage",
+             "parameters": {
+                "fileUri": fileUri,
+                "_type": "image"
+             }
+             })
+
+    def _downloadFile(self, fileUri: str, path: str, chunkSize: int, resume: bool) -> bool:
+        url = self._request("commands/execute")
+        header = {"Content-Type": "application/json; charset=UTF-8", 
+                  "X-Content-Type-Options": "nosniff",
+                  "X-XSRF-Protected": '1'}
+        print( "Writing file : %s" % os.path.basename(path) )
+        return self._saveStream(url, self._downloadBody(fileUri), header, path, chunkSize, resume)
+
+    def downloadFiles(self, files: list, dir: str = './', workers: int = 4,
+                      chunkSize: int = 1 << 20, resume: bool = True) -> dict[str, bool]:
+        """
+        Transfer several files from the camera concurrently.
+
+        files:
+                List of fileUri strings, or of entries returned by listAll or
+                listImages. Files already present locally are skipped, with
+                the same size when the entry gives one.
+        dir:
+                String Destination directory.
+        workers:
+                Integer Number of concurrent transfers. Also bounded by the
+                size of the connection pool.
+        chunkSize:
+                Integer Number of bytes read from the network at once.
+        resume:
+                Boolean Resume the interrupted transfers.
+
+        Returns a dict mapping each fileUri to whether it is acquired.
+        """
+        d = dir + ('/' if not dir.endswith('/') else '')
+        os.makedirs(d, exist_ok=True)
+
+        results = {}
+        pending = {}
+        for entry in files:
+            fileUri = entry['uri'] if isinstance(entry, dict) else entry
+            size = entry.get('size') if isinstance(entry, dict) else None
+            path = d + localFileName(fileUri)
+            if os.path.exists(path) and (size is None or os.path.getsize(path) == size):
+                print( "Already acquired : %s" % fileUri )
+                results[fileUri] = True
+            else:
+                pending[fileUri] = path
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(self._downloadFile, fileUri, path, chunkSize, resume): fileUri
+                       for fileUri, path in pending.items()}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return results
 
     def getMetadata(self, fileUri: str) -> (dict | None):
         """
@@ -586,7 +864,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -608,33 +886,58 @@ class OpenSphericalCamera:
         https://developers.google.com/streetview/open-spherical-camera/reference/camera/setoptions
         https://developers.theta360.com/en/docs/v2/api_reference/commands/camera.set_options.html
         """
-        if self.sid == None or option not in self.getOptionNames():
+        if option not in self.getOptionNames() or self._sessionId() is None:
             response = None
             return response
 
-        print( "setOption - %s : %s" % (option, value) )
+        return self.setOptions({option: value})
+
+    def setOptions(self, options: dict) -> (dict | None):
+        """
+        Set several options in a single command. The options whose name is
+        invalid are ignored, as well as those already set to the same value
+        according to the option cache. The cached options depending on the
+        ones set are evicted, they are retrieved again on the next
+        getOption(s).
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/setoptions
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera.set_options.html
+        """
+        if self._sessionId() is None:
+            response = None
+            return response
+
+        optionNames = self.getOptionNames()
+        options = {option: value for option, value in options.items()
+                   if option in optionNames
+                   and (option not in self._options or self._options[option] != value)}
+        if not options:
+            return {"name": "camera.setOptions", "state": "done"}
+
+        for option, value in options.items():
+            print( "setOption - %s : %s" % (option, value) )
 
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera.setOptions",
              "parameters": {
                 "sessionId": self.sid,
-                "options": {
-                        option: value,
-                        }
+                "options": options
              }
              })
         header = {"Content-Type": "application/json; charset=UTF-8", 
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
 
         if req.status_code == 200:
             response = req.json()
-            #print( "setOption suceeeded - %s " % response )
+            self._evictDependents(options)
+            self._options.update(options)
         else:
             self._oscError(req)
             response = None
@@ -649,30 +952,77 @@ class OpenSphericalCamera:
         https://developers.google.com/streetview/open-spherical-camera/reference/camera/getoptions
         https://developers.theta360.com/en/docs/v2/api_reference/commands/camera.get_options.html
         """
-        url = self._request("commands/execute")
-        body = json.dumps({"name": "camera.getOptions",
-             "parameters": {
-                "sessionId": self.sid,
-                "optionNames": [
-                        option]
-             }
-             })
-        header = {"Content-Type": "application/json; charset=UTF-8", 
-                  "X-Content-Type-Options": "nosniff",
-                  "X-XSRF-Protected": '1'}
-        try:
-            req = requests.post(url, data=body, headers=header)
-        except Exception as e:
-            self._httpError(e)
-            return None
+        options = self.getOptions([option])
+        return options.get(option) if options else None
 
-        if req.status_code == 200:
-            response = req.json()
-            value = response["results"]["options"][option]
-        else:
-            self._oscError(req)
-            value = None
-        return value
+    def getOptions(self, optionNames: list[str]) -> (dict | None):
+        """
+        Get several option values. The values found in the option cache are
+        returned without any request, the others are retrieved in a single
+        command. The volatile options, e.g. remainingPictures, are always
+        retrieved.
+
+        Reference:
+        https://developers.google.com/streetview/open-spherical-camera/reference/camera/getoptions
+        https://developers.theta360.com/en/docs/v2/api_reference/commands/camera.get_options.html
+        """
+        volatile = self.getVolatileOptions()
+        missing = [option for option in optionNames if option not in self._options or option in volatile]
+        fetched = {}
+        if missing:
+            url = self._request("commands/execute")
+            body = json.dumps({"name": "camera.getOptions",
+                 "parameters": {
+                    "sessionId": self._sessionId(),
+                    "optionNames": missing
+                 }
+                 })
+            header = {"Content-Type": "application/json; charset=UTF-8", 
+                      "X-Content-Type-Options": "nosniff",
+                      "X-XSRF-Protected": '1'}
+            try:
+                req = self._post(url, data=body, headers=header)
+            except Exception as e:
+                self._httpError(e)
+                return None
+
+            if req.status_code == 200:
+                response = req.json()
+                fetched = response["results"]["options"]
+                self._cacheOptions(fetched)
+            else:
+                self._oscError(req)
+                return None
+
+        values = {**self._options, **fetched}
+        return {option: values[option] for option in optionNames if option in values}
+
+    def invalidateOptions(self) -> None:
+        """
+        Forget the cached option values, they are retrieved again on the
+        next getOption(s).
+        """
+        self._options = {}
+
+    def _cacheOptions(self, options: dict) -> None:
+        """
+        Keep option values retrieved from the camera, but the volatile ones.
+        """
+        volatile = self.getVolatileOptions()
+        self._options.update({option: value for option, value in options.items() if option not in volatile})
+
+    def _evictDependents(self, options: dict) -> None:
+        """
+        Forget the cached values of the options the camera may have changed
+        when setting options.
+        """
+        dependents = self.getOptionDependents()
+        for option in options:
+            if option in dependents and dependents[option] is None:
+                self._options = {}
+                return
+            for dependent in dependents.get(option, []):
+                self._options.pop(dependent, None)
 
     def getSid(self) -> (str | None):
         """
@@ -681,7 +1031,7 @@ class OpenSphericalCamera:
         """
         url = self._request("state")
         try:
-            req = requests.post(url)
+            req = self._post(url)
         except Exception as e:
             self._httpError(e)
             self.sid = None
@@ -703,7 +1053,7 @@ class OpenSphericalCamera:
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera.getOptions",
                  "parameters": {
-                    "sessionId": self.sid,
+                    "sessionId": self._sessionId(),
                     "optionNames": self.getOptionNames()
                  }
              })
@@ -711,7 +1061,7 @@ class OpenSphericalCamera:
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -719,6 +1069,7 @@ class OpenSphericalCamera:
         if req.status_code == 200:
             response = req.json()
             returnOptions = response["results"]["options"]
+            self._cacheOptions(returnOptions)
         else:
             self._oscError(req)
             returnOptions = None
@@ -0,0 +1,277 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    preview.py                                         :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/17 14:03:27 by abrar             #+#    #+#              #
+#    Updated: 2024/09/17 14:03:27 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Multi-stage pipeline used to save and display the live preview.
+
+The stages run on their own threads and are joined by bounded queues:
+    receive -> decode/rearrange -> encode/write
+                                -> display (caller thread, for OpenCV windows)
+When a queue is full, the oldest frame is dropped by default so that the
+reception of the stream never waits for the processing.
+
+Without display nor rearrangement, the received frames go straight to the
+writers and are never decoded.
+"""
+
+import os
+import queue
+import threading
+from typing import Callable, Iterable
+
+import cv2
+import numpy as np
+from image_processor import lens_bounds, rearrange_lenses
+from mjpeg import iter_frames
+
+
+__all__ = ['FrameQueue', 'LivePreviewPipeline']
+
+
+class FrameQueue(queue.Queue):
+    """
+    Bounded queue which can drop its oldest item instead of blocking the
+    producer when it is full.
+    """
+
+    def __init__(self, maxsize: int, dropOldest: bool = True) -> None:
+        super().__init__(maxsize)
+        self.dropOldest = dropOldest
+        self.dropped = 0
+
+    def put(self, item, block: bool = True, timeout: float | None = None) -> None:
+        if not self.dropOldest:
+            super().put(item, block, timeout)
+            return
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self._get()
+                self.dropped += 1
+            else:
+                self.unfinished_tasks += 1
+            self._put(item)
+            self.not_empty.notify()
+
+
+class LivePreviewPipeline:
+    """
+    Save the frames of a live preview stream, optionally with the front and
+    back rearranged views, and display them.
+
+    dir:
+            String Output directory, ending with '/'
+    decodeWorkers:
+            Integer Number of threads decoding and rearranging frames
+    writeWorkers:
+            Integer Number of threads encoding and writing frames
+    queueSize:
+            Integer Capacity of each queue between two stages
+    dropOldest:
+            Boolean Drop the oldest frame of a full queue instead of
+            waiting for the next stage
+    display:
+            Boolean Show the frames in OpenCV windows, requires a GUI
+    rearrange:
+            Boolean Also save the front and back rearranged views
+    """
+    fileNamePrefix = "livePreview"
+
+    def __init__(self, dir: str = './', decodeWorkers: int = 2, writeWorkers: int = 2,
+                 queueSize: int = 8, dropOldest: bool = True,
+                 display: bool = True, rearrange: bool = True) -> None:
+        self.dir = dir
+        self.display = display
+        self.rearrange = rearrange
+        # Raw frames are only decoded when something needs the pixels
+        self.decodeWorkers = decodeWorkers if display or rearrange else 0
+        self.writeWorkers = writeWorkers
+
+        # Front views already written, reused by the decoders rather than
+        # allocating one per frame
+        self._frontBuffers = queue.SimpleQueue()
+
+        self._decodeQueue = FrameQueue(queueSize, dropOldest)
+        self._writeQueue = FrameQueue(queueSize, dropOldest)
+        # The display only ever needs the latest frame
+        self._displayQueue = FrameQueue(1, True)
+
+        self._stop = threading.Event()
+        self._received = threading.Event()
+        self._decoded = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {'received': 0, 'decoded': 0, 'written': 0}
+
+        subdirs = (self.fileNamePrefix, "back", "front") if rearrange else (self.fileNamePrefix,)
+        for subdir in subdirs:
+            os.makedirs(f"{dir}{subdir}", exist_ok=True)
+
+    def stop(self) -> None:
+        """
+        Stop receiving frames, the frames already received are still saved.
+        """
+        self._stop.set()
+
+    def _count(self, stage: str) -> None:
+        with self._lock:
+            self.stats[stage] += 1
+
+    def _consume(self, inbox: FrameQueue, upstreamDone: threading.Event,
+                 work: Callable) -> None:
+        """
+        Process the items of a queue until the previous stage is over and
+        the queue is empty.
+        """
+        while True:
+            try:
+                item = inbox.get(timeout=0.05)
+            except queue.Empty:
+                if upstreamDone.is_set():
+                    return
+                continue
+            try:
+                work(item)
+            except Exception as e:
+                print( "Live preview - frame skipped : %s" % repr(e) )
+
+    def _receive(self, chunks: Iterable[bytes]) -> None:
+        try:
+            for i, jpg in enumerate(iter_frames(chunks)):
+                if self._stop.is_set():
+                    break
+                # The demuxer reuses its buffer, keep a copy of the frame
+                if self.decodeWorkers:
+                    self._decodeQueue.put((i, bytes(jpg)))
+                else:
+                    self._writeQueue.put((i, bytes(jpg), None, None))
+                self._count('received')
+        except Exception as e:
+            # The stream is closed under our feet when stopping
+            if not self._stop.is_set():
+                print( "Live preview - reception stopped : %s" % repr(e) )
+        finally:
+            self._received.set()
+
+    @staticmethod
+    def _frontShape(img: np.ndarray) -> tuple:
+        a, c = lens_bounds(img.shape[1])
+        return (img.shape[0], img.shape[1] - (c - a)) + img.shape[2:]
+
+    def _frontBuffer(self, img: np.ndarray) -> np.ndarray | None:
+        """
+        A front view buffer released by the writers, if one fits the frame.
+        """
+        try:
+            buffer = self._frontBuffers.get_nowait()
+        except queue.Empty:
+            return None
+        return buffer if buffer.shape == self._frontShape(img) else None
+
+    def _decode(self, item: tuple) -> None:
+        i, jpg = item
+        img = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return
+
+        if self.rearrange:
+            # The back view is a slice of the frame, only the front one is copied
+            back_concat, front_concat = rearrange_lenses(img, front=self._frontBuffer(img))
+            self._writeQueue.put((i, jpg, back_concat, front_concat))
+        else:
+            self._writeQueue.put((i, jpg, None, None))
+        if self.display:
+            self._displayQueue.put(img)
+        self._count('decoded')
+
+    def _write(self, item: tuple) -> None:
+        i, jpg, back_concat, front_concat = item
+        dir, prefix = self.dir, self.fileNamePrefix
+        with open(f"{dir}{prefix}/{prefix}{i}.jpg", 'wb') as handler:
+            handler.write(jpg)
+        if back_concat is None:
+            self._count('written')
+            return
+        with open(f"{dir}back/back{i}.jpg", 'wb') as handlerback:
+            handlerback.write(cv2.imencode('.jpg', back_concat)[1])
+        with open(f"{dir}front/front{i}.jpg", 'wb') as handlerfront:
+            handlerfront.write(cv2.imencode('.jpg', front_concat)[1])
+        self._frontBuffers.put(front_concat)
+        self._count('written')
+
+    def _display(self, upstream: list[threading.Thread]) -> None:
+        """
+        Show the latest frames until 'q' is pressed or the stream ends.
+        """
+        if not self.display:
+            for thread in upstream:
+                thread.join()
+            return
+
+        prefix = self.fileNamePrefix
+        # The views of the displayed frames are rebuilt into the same buffer,
+        # the frames handed to the writers are not shared with the display
+        front_concat = None
+        while any(thread.is_alive() for thread in upstream):
+            try:
+                img = self._displayQueue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if front_concat is not None and front_concat.shape != self._frontShape(img):
+                front_concat = None
+            back_concat, front_concat = rearrange_lenses(img, front=front_concat)
+            cv2.imshow(prefix+'Back', back_concat)
+            cv2.imshow(prefix+'Front', front_concat)
+            cv2.imshow(prefix, img)
+
+            # press 'q' on the keyboard to close the windows
+            if (cv2.waitKey(1) & 0xFF == ord('q')):
+                self.stop()
+                break
+        cv2.destroyAllWindows()
+
+    def run(self, chunks: Iterable[bytes], onStop: Callable | None = None) -> dict:
+        """
+        Process a stream of chunks, e.g. `response.iter_content(chunkSize)`,
+        until it ends or the user stops the preview. `onStop` is called to
+        interrupt the reception, e.g. `response.close`.
+
+        Returns the number of frames handled by each stage and dropped by
+        each queue.
+        """
+        receiver = threading.Thread(target=self._receive, args=(chunks,), daemon=True)
+        decoders = [threading.Thread(target=self._consume,
+                                     args=(self._decodeQueue, self._received, self._decode),
+                                     daemon=True)
+                    for _ in range(self.decodeWorkers)]
+        writers = [threading.Thread(target=self._consume,
+                                    args=(self._writeQueue, self._decoded, self._write),
+                                    daemon=True)
+                   for _ in range(self.writeWorkers)]
+
+        for thread in [receiver] + decoders + writers:
+            thread.start()
+
+        try:
+            self._display([receiver] + decoders)
+        except KeyboardInterrupt:
+            self.stop()
+
+        if self._stop.is_set() and onStop is not None:
+            onStop()
+        receiver.join()
+        for thread in decoders:
+            thread.join()
+        self._decoded.set()
+        for thread in writers:
+            thread.join()
+
+        self.stats['dropped'] = self._decodeQueue.dropped + self._writeQueue.dropped
+        return self.stats
@@ -0,0 +1,230 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    rig.py                                             :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/20 15:31:52 by abrar             #+#    #+#              #
+#    Updated: 2024/09/20 15:31:52 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Synchronized capture on several Ricoh Theta S cameras.
+
+Each camera keeps its session and connection open, and is driven by its own
+thread. The sessions are kept alive in the background between captures, and
+started again if they expired anyway. The threads are released together by
+a barrier right before sending the trigger, so the skew between cameras is
+reduced to the network latency.
+The trigger, acknowledgement and completion times of each camera are
+recorded to measure that skew.
+
+The cameras must be reachable at different addresses, e.g. in client mode
+on the same access point.
+"""
+
+import argparse
+import os
+import pprint
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import theta
+
+
+__all__ = ['CameraRig']
+
+
+class CameraRig:
+    """
+    ips:
+            List of the addresses of the cameras
+    httpPort:
+            Integer Port of the cameras
+    timeout:
+            Float or (connect, read) tuple in seconds for every request
+    keepAliveInterval:
+            Float Time in seconds between two updates of the sessions, below
+            the session timeout of the cameras (180 s), 0 to never update them
+    """
+
+    def __init__(self, ips: list[str], httpPort: int = 80,
+                 timeout: float | tuple[float, float] = (5.0, 30.0),
+                 keepAliveInterval: float = 60.0) -> None:
+        self.ips = ips
+        self.cameras = [theta.RicohThetaS(ip, httpPort, timeout=timeout) for ip in ips]
+        # Open the sessions ahead of the first trigger
+        self._each(lambda camera: camera.connect())
+
+        self._closed = threading.Event()
+        self._keeper = None
+        if keepAliveInterval > 0:
+            self._keeper = threading.Thread(target=self._keepAliveLoop, args=(keepAliveInterval,), daemon=True)
+            self._keeper.start()
+
+    def _each(self, action: Callable) -> list:
+        """
+        Run an action on every camera concurrently and return the results in
+        the order of the cameras.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.cameras)) as executor:
+            return list(executor.map(action, self.cameras))
+
+    def keepAlive(self) -> None:
+        """
+        Keep the sessions of the cameras open between captures. The sessions
+        which expired anyway are started again.
+        """
+        def update(camera: theta.RicohThetaS) -> None:
+            # An invalidSessionId answer drops the session of the camera
+            if camera.updateSession() is None and camera.sid is None:
+                camera.startSession()
+
+        self._each(update)
+
+    def _keepAliveLoop(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            self.keepAlive()
+
+    def prepare(self, options: dict) -> None:
+        """
+        Set the same options on every camera ahead of the captures, e.g.
+        {"captureMode": "image", "iso": 400}.
+        """
+        self._each(lambda camera: camera.setOptions(options))
+
+    def _fire(self, trigger: Callable, complete: Callable | None = None) -> list[dict]:
+        """
+        Send a trigger to every camera at the same time, then optionally
+        wait for each capture to complete.
+        """
+        barrier = threading.Barrier(len(self.cameras))
+
+        def fire(camera: theta.RicohThetaS) -> dict:
+            record = {'camera': self.name(camera)}
+            # Start the session again before the barrier if it expired
+            if camera.sid is None:
+                camera.startSession()
+            barrier.wait()
+            record['trigger'] = time.perf_counter()
+            record['response'] = trigger(camera)
+            if record['response'] is None and camera.sid is None:
+                # The session expired under the trigger, send it again on a new one
+                camera.startSession()
+                record['response'] = trigger(camera)
+            record['acknowledged'] = time.perf_counter()
+            if complete is not None:
+                record['result'] = complete(camera, record['response'])
+                record['completed'] = time.perf_counter()
+            return record
+
+        records = self._each(fire)
+        # Express the timestamps relative to the first trigger
+        origin = min(record['trigger'] for record in records)
+        for record in records:
+            for key in ('trigger', 'acknowledged', 'completed'):
+                if key in record:
+                    record[key] -= origin
+        return records
+
+    def takePicture(self, wait: bool = True) -> list[dict]:
+        """
+        Take a picture on every camera at the same time. With `wait`, also
+        poll each camera until the picture is processed and record its
+        fileUri as result.
+        """
+        def complete(camera: theta.RicohThetaS, response: dict | None) -> str | None:
+            if response and 'id' in response:
+                status = camera.waitForProcessing(response['id'])
+                if status and 'fileUri' in status.get('results', {}):
+                    return status['results']['fileUri']
+            return camera.latestFileUri()
+
+        return self._fire(lambda camera: camera.takePicture(), complete if wait else None)
+
+    def startCapture(self) -> list[dict]:
+        """
+        Start a video capture on every camera at the same time.
+        """
+        return self._fire(lambda camera: camera.startCapture())
+
+    def stopCapture(self) -> list[dict]:
+        """
+        Stop the video capture of every camera at the same time.
+        """
+        return self._fire(lambda camera: camera.stopCapture(),
+                          lambda camera, response: camera.latestFileUri())
+
+    @staticmethod
+    def name(camera: theta.RicohThetaS) -> str:
+        """
+        Serial number of the camera, or its address when unknown.
+        """
+        info = camera._info or {}
+        return str(info.get('serialNumber', camera._ip))
+
+    def download(self, records: list[dict], dir: str = './', workers: int = 2) -> list[dict]:
+        """
+        Transfer the results of a capture from all the cameras in parallel,
+        in a sub-directory named after each camera.
+        """
+        d = dir + ('/' if not dir.endswith('/') else '')
+
+        def download(camera: theta.RicohThetaS, record: dict) -> dict:
+            if not record.get('result'):
+                return {}
+            return camera.downloadFiles([record['result']], d + self.name(camera), workers)
+
+        with ThreadPoolExecutor(max_workers=len(self.cameras)) as executor:
+            return list(executor.map(download, self.cameras, records))
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._keeper is not None:
+            self._keeper.join()
+        self._each(lambda camera: camera.closeSession())
+
+    @staticmethod
+    def skew(records: list[dict]) -> dict:
+        """
+        Spread in seconds between the cameras of each recorded timestamp.
+        """
+        report = {}
+        for key in ('trigger', 'acknowledged', 'completed'):
+            values = [record[key] for record in records if key in record]
+            if values:
+                report[key] = max(values) - min(values)
+        return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Take synchronized pictures with several Ricoh Theta S cameras.')
+    parser.add_argument('ips', nargs='+', help='IP addresses of the cameras.')
+    parser.add_argument('--dir', default='./', help='Directory to save the pictures in, one sub-directory per camera. Default is the current directory.')
+    parser.add_argument('-n', default=1, type=int, help='Number of synchronized pictures to take.')
+    parser.add_argument('--no-download', action='store_true', help='Leave the pictures on the cameras.')
+    args = parser.parse_args()
+
+    rig = CameraRig(args.ips)
+    rig.prepare({"captureMode": "image"})
+
+    for i in range(args.n):
+        print(60 * "=")
+        print(f"Taking picture {i}...")
+        records = rig.takePicture()
+        pprint.pprint(records)
+        print("Skew between cameras (seconds):")
+        pprint.pprint(CameraRig.skew(records))
+        if not args.no_download:
+            os.makedirs(args.dir, exist_ok=True)
+            rig.download(records, args.dir)
+
+    rig.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,547 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    simulator.py                                       :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/24 10:05:44 by abrar             #+#    #+#              #
+#    Updated: 2024/09/24 10:05:44 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Local stand-in for a Ricoh Theta S, implementing the Open Spherical Camera
+endpoints used by `osc.py` and the Ricoh extensions used by `theta.py`.
+
+The pictures are taken from a directory of JPEGs, which are also streamed by
+camera._getLivePreview. The latency, the bandwidth and the rate of errors of
+the camera can be configured, so that the client can be measured without a
+camera on the network:
+
+    python3 acquisition/simulator.py --port 8080 --latency 0.02 --bandwidth 2e6
+
+    with Simulator(latency=0.02) as simulator:
+        camera = theta.RicohThetaS("127.0.0.1", simulator.port)
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+__all__ = ['Simulator']
+
+_defaultFrames = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'projection', 'livePreview')
+
+_boundary = "---osclivepreview---"
+
+# File formats of each capture mode
+_imageFormat = {"type": "jpeg", "width": 5376, "height": 2688}
+_videoFormat = {"type": "mp4", "width": 1920, "height": 1080}
+
+# Storage of the camera, in bytes and in pictures
+_totalSpace = 8 * 1024 ** 3
+_totalPictures = 2000
+
+
+class _Camera:
+    """
+    State of the simulated camera, shared by the request handlers.
+    """
+
+    def __init__(self, frames: list[bytes], processingTime: float, videoSize: int,
+                 sessionTimeout: float) -> None:
+        self.lock = threading.Lock()
+        self.frames = frames
+        self.processingTime = processingTime
+        self.videoSize = videoSize
+        self.sessionTimeout = sessionTimeout
+
+        self.sid = None
+        self.sessionCount = 0
+        self.sessionUsed = 0.0      # time of the last command of the session
+        self.fingerprint = 0
+        self.options = {"captureMode": "image", "iso": 0, "shutterSpeed": 0,
+                        "whiteBalance": "auto", "exposureProgram": 2, "_filter": "off",
+                        "fileFormat": _imageFormat}
+        self.files = {}             # fileUri -> bytes
+        self.commands = {}          # id -> (ready time, name, results)
+        self.processing = []        # (ready time, id, picture) of the pictures being processed
+        self.commandCount = 0
+        self.capture = None         # start time of the video capture
+        self.fileCount = 100000
+
+    def update(self) -> None:
+        self.fingerprint += 1
+
+    def newFile(self, extension: str, data: bytes) -> str:
+        self.fileCount += 1
+        fileUri = "100RICOH/R%07d.%s" % (self.fileCount, extension)
+        self.files[fileUri] = data
+        self.update()
+        return fileUri
+
+    def settle(self) -> None:
+        """
+        Store the pictures whose processing is over. As on the camera, the
+        file, and thus the state, only appear at that moment.
+        """
+        now = time.monotonic()
+        while self.processing and self.processing[0][0] <= now:
+            ready, command_id, data = self.processing.pop(0)
+            _, name, _ = self.commands[command_id]
+            self.commands[command_id] = (ready, name, {"fileUri": self.newFile("JPG", data)})
+
+    def latestFileUri(self) -> str:
+        return next(reversed(self.files), "")
+
+    def storage(self) -> dict:
+        """
+        Read-only options of the storage, which change with every file.
+        """
+        pictures = sum(1 for fileUri in self.files if fileUri.endswith(".JPG"))
+        return {"totalSpace": _totalSpace,
+                "remainingSpace": _totalSpace - sum(len(data) for data in self.files.values()),
+                "remainingPictures": _totalPictures - pictures}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ThetaSimulator/1.0"
+    # The headers and the body are written separately: on a kept-alive
+    # connection, Nagle's algorithm would hold the body until the client
+    # acknowledges the headers, i.e. a delayed ACK of ~40 ms per request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    @property
+    def camera(self) -> _Camera:
+        return self.server.camera
+
+    # Transport
+
+    def _write(self, data: bytes) -> None:
+        """
+        Write the body, throttled to the configured bandwidth.
+        """
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(data)
+            return
+        block = 64 * 1024
+        for i in range(0, len(data), block):
+            chunk = data[i:i + block]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / bandwidth)
+
+    def _send(self, status: int, body: bytes, contentType: str = "application/json; charset=utf-8",
+              headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._write(body)
+
+    def _json(self, payload: dict, status: int = 200) -> None:
+        self._send(status, json.dumps(payload).encode())
+
+    def _error(self, name: str, status: int, code: str, message: str) -> None:
+        self._json({"name": name, "state": "error",
+                    "error": {"code": code, "message": message}}, status)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(data) if data else {}
+        except ValueError:
+            return {}
+
+    def _injectFaults(self, name: str) -> bool:
+        """
+        Apply the latency and maybe answer with an error. Returns True when
+        the request has been answered.
+        """
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.errorRate and self.server.random.random() < self.server.errorRate:
+            self._error(name, 503, "serviceUnavailable", "Injected error")
+            return True
+        return False
+
+    # Endpoints
+
+    def do_GET(self) -> None:
+        if self._injectFaults("info"):
+            return
+        if self.path != "/osc/info":
+            self._error("", 404, "unknownCommand", "Unknown path %s" % self.path)
+            return
+        port = self.server.server_address[1]
+        self._json({
+            "manufacturer": "RICOH", "model": "RICOH THETA S (simulated)",
+            "serialNumber": "%08d" % port, "firmwareVersion": "01.82",
+            "supportUrl": "https://theta360.com/en/support/",
+            "endpoints": {"httpPort": port, "httpUpdatesPort": port},
+            "gps": False, "gyro": False, "uptime": int(time.monotonic()),
+            "api": ["/osc/info", "/osc/state", "/osc/checkForUpdates",
+                    "/osc/commands/execute", "/osc/commands/status"]
+        })
+
+    def do_POST(self) -> None:
+        body = self._body()
+        name = body.get("name", self.path)
+        if self._injectFaults(name):
+            return
+
+        camera = self.camera
+        with camera.lock:
+            camera.settle()
+        if self.path == "/osc/state":
+            with camera.lock:
+                self._json({"fingerprint": "FIG_%04d" % camera.fingerprint,
+                            "state": {"sessionId": camera.sid or "", "batteryLevel": 1.0,
+                                      "storageChanged": False,
+                                      "_captureStatus": "shooting" if camera.capture else "idle",
+                                      "_recordedTime": 0, "_recordableTime": 1500,
+                                      "_latestFileUri": camera.latestFileUri(),
+                                      "_batteryState": "charged"}})
+        elif self.path == "/osc/checkForUpdates":
+            with camera.lock:
+                self._json({"stateFingerprint": "FIG_%04d" % camera.fingerprint,
+                            "throttleTimeout": 60})
+        elif self.path == "/osc/commands/status":
+            self._status(body.get("id"))
+        elif self.path == "/osc/commands/execute":
+            command = getattr(self, "_command_" + name.replace("camera.", "").lstrip("_"), None)
+            if command is None:
+                self._error(name, 400, "unknownCommand", "Unknown command %s" % name)
+            else:
+                command(name, body.get("parameters", {}))
+        else:
+            self._error(name, 404, "unknownCommand", "Unknown path %s" % self.path)
+
+    def _status(self, command_id: str) -> None:
+        camera = self.camera
+        with camera.lock:
+            if command_id not in camera.commands:
+                self._error("camera.takePicture", 400, "invalidParameterValue", "Unknown id")
+                return
+            camera.settle()
+            ready, name, results = camera.commands[command_id]
+            if not results:
+                self._json({"name": name, "state": "inProgress", "id": command_id,
+                            "progress": {"completion": 0.5}})
+            else:
+                self._json({"name": name, "state": "done", "results": results})
+
+    def _checkSession(self, name: str, parameters: dict) -> bool:
+        camera = self.camera
+        now = time.monotonic()
+        # As on the camera, an idle session expires
+        if camera.sid is not None and now - camera.sessionUsed > camera.sessionTimeout:
+            camera.sid = None
+        if parameters.get("sessionId") != camera.sid or camera.sid is None:
+            self._error(name, 403, "invalidSessionId", "Invalid session")
+            return False
+        camera.sessionUsed = now
+        return True
+
+    # Commands
+
+    def _command_startSession(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            camera.sessionCount += 1
+            camera.sid = "SID_%04d" % camera.sessionCount
+            camera.sessionUsed = time.monotonic()
+            camera.update()
+            self._json({"name": name, "state": "done",
+                        "results": {"sessionId": camera.sid, "timeout": camera.sessionTimeout}})
+
+    def _command_updateSession(self, name: str, parameters: dict) -> None:
+        if self._checkSession(name, parameters):
+            self._json({"name": name, "state": "done",
+                        "results": {"sessionId": self.camera.sid, "timeout": self.camera.sessionTimeout}})
+
+    def _command_closeSession(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if self._checkSession(name, parameters):
+                camera.sid = None
+                camera.update()
+                self._json({"name": name, "state": "done"})
+
+    def _command_finishWlan(self, name: str, parameters: dict) -> None:
+        if self._checkSession(name, parameters):
+            self._json({"name": name, "state": "done"})
+
+    def _command_setOptions(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if self._checkSession(name, parameters):
+                options = parameters.get("options", {})
+                # As on the camera, the file format follows the capture mode
+                if "captureMode" in options and options["captureMode"] != camera.options["captureMode"]:
+                    camera.options["fileFormat"] = (_videoFormat if options["captureMode"] == "_video"
+                                                    else _imageFormat)
+                camera.options.update(options)
+                camera.update()
+                self._json({"name": name, "state": "done"})
+
+    def _command_getOptions(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if self._checkSession(name, parameters):
+                values = {**camera.options, **camera.storage()}
+                options = {option: values.get(option)
+                           for option in parameters.get("optionNames", [])}
+                self._json({"name": name, "state": "done", "results": {"options": options}})
+
+    def _command_takePicture(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if not self._checkSession(name, parameters):
+                return
+            if camera.options.get("captureMode") != "image":
+                self._error(name, 403, "disabledCommand", "captureMode is not image")
+                return
+            camera.commandCount += 1
+            command_id = str(camera.commandCount)
+            ready = time.monotonic() + camera.processingTime
+            camera.commands[command_id] = (ready, name, {})
+            camera.processing.append((ready, command_id, next(self.server.pictures)))
+            camera.settle()
+            self._json({"name": name, "state": "inProgress", "id": command_id,
+                        "progress": {"completion": 0}})
+
+    def _command_startCapture(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if self._checkSession(name, parameters):
+                camera.capture = time.monotonic()
+                camera.update()
+                self._json({"name": name, "state": "done"})
+
+    def _command_stopCapture(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if not self._checkSession(name, parameters):
+                return
+            if camera.capture is None:
+                self._error(name, 403, "disabledCommand", "No capture in progress")
+                return
+            camera.capture = None
+            if camera.options.get("captureMode") == "_video":
+                camera.newFile("MP4", os.urandom(camera.videoSize))
+            else:
+                camera.newFile("JPG", next(self.server.pictures))
+            self._json({"name": name, "state": "done"})
+
+    def _entries(self, detail: bool) -> list[dict]:
+        entries = []
+        for fileUri, data in reversed(self.camera.files.items()):
+            entry = {"name": fileUri.split("/")[-1], "uri": fileUri, "size": len(data),
+                     "dateTime": "2024:09:24 10:00:00+02:00"}
+            if detail:
+                entry.update({"isProcessed": True, "previewUri": "", "_thumbSize": 0,
+                              "_intervalCaptureGroupId": "", "_recordTime": 0})
+            entries.append(entry)
+        return entries
+
+    def _command_listAll(self, name: str, parameters: dict) -> None:
+        with self.camera.lock:
+            entries = self._entries(parameters.get("detail", True))
+        if parameters.get("sort") == "oldest":
+            entries.reverse()
+        count = parameters.get("entryCount", len(entries))
+        self._json({"name": name, "state": "done",
+                    "results": {"entries": entries[:count], "totalEntries": len(entries)}})
+
+    def _command_listImages(self, name: str, parameters: dict) -> None:
+        with self.camera.lock:
+            entries = [entry for entry in self._entries(False) if entry["uri"].endswith("JPG")]
+        count = parameters.get("entryCount", len(entries))
+        self._json({"name": name, "state": "done",
+                    "results": {"entries": entries[:count], "totalEntries": len(entries)}})
+
+    def _command_delete(self, name: str, parameters: dict) -> None:
+        camera = self.camera
+        with camera.lock:
+            if camera.files.pop(parameters.get("fileUri"), None) is None:
+                self._error(name, 400, "invalidParameterValue", "Unknown fileUri")
+                return
+            camera.update()
+            self._json({"name": name, "state": "done"})
+
+    def _command_getMetadata(self, name: str, parameters: dict) -> None:
+        if parameters.get("fileUri") not in self.camera.files:
+            self._error(name, 400, "invalidParameterValue", "Unknown fileUri")
+            return
+        self._json({"name": name, "state": "done",
+                    "results": {"exif": {"ImageWidth": 5376, "ImageLength": 2688},
+                                "xmp": {"ProjectionType": "equirectangular"}}})
+
+    def _sendFile(self, name: str, fileUri: str, contentType: str) -> None:
+        data = self.camera.files.get(fileUri)
+        if data is None:
+            self._error(name, 400, "invalidParameterValue", "Unknown fileUri")
+            return
+        # Range requests allow the client to resume a transfer
+        match = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match:
+            offset = int(match.group(1))
+            if offset >= len(data):
+                self._send(416, b"", contentType, {"Content-Range": "bytes */%d" % len(data)})
+                return
+            self._send(206, data[offset:], contentType,
+                       {"Content-Range": "bytes %d-%d/%d" % (offset, len(data) - 1, len(data))})
+        else:
+            self._send(200, data, contentType)
+
+    def _command_getImage(self, name: str, parameters: dict) -> None:
+        self._sendFile(name, parameters.get("fileUri"), "image/jpeg")
+
+    def _command_getVideo(self, name: str, parameters: dict) -> None:
+        self._sendFile(name, parameters.get("fileUri"), "video/mp4")
+
+    def _command_getLivePreview(self, name: str, parameters: dict) -> None:
+        if not self._checkSession(name, parameters):
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=\"%s\"" % _boundary)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        period = 1.0 / self.server.fps if self.server.fps else 0
+        next_frame = time.monotonic()
+        try:
+            for jpg in itertools.cycle(self.camera.frames):
+                header = ("--%s\r\nContent-type: image/jpeg\r\nContent-Length: %d\r\n\r\n"
+                          % (_boundary, len(jpg))).encode()
+                self._write(header + jpg + b"\r\n")
+                next_frame += period
+                time.sleep(max(0, next_frame - time.monotonic()))
+        except ConnectionError:
+            # The client stopped the preview
+            pass
+
+
+class Simulator:
+    """
+    HTTP server simulating a Ricoh Theta S, running on a background thread.
+
+    port:
+            Integer Port to listen on, 0 to pick a free one
+    frames:
+            String Directory of the JPEGs used for the pictures and the live
+            preview, projection/livePreview by default
+    latency:
+            Float Delay in seconds added before answering each request
+    bandwidth:
+            Float Throughput in bytes per second of the answers, 0 for no limit
+    errorRate:
+            Float Probability for a request to fail with serviceUnavailable
+    processingTime:
+            Float Time in seconds before a picture is processed
+    fps:
+            Float Frame rate of the live preview
+    videoSize:
+            Integer Size in bytes of the recorded videos
+    sessionTimeout:
+            Float Time in seconds after which an idle session expires
+    seed:
+            Integer Seed of the error injection, for reproducible runs
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, frames: str = _defaultFrames,
+                 latency: float = 0.0, bandwidth: float = 0.0, errorRate: float = 0.0,
+                 processingTime: float = 1.0, fps: float = 30.0, videoSize: int = 4 << 20,
+                 sessionTimeout: float = 180.0, seed: int = 0, verbose: bool = False) -> None:
+        files = sorted(glob.glob(os.path.join(frames, "*.jpg")),
+                       key=lambda path: [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", path)])
+        images = [data for data in (open(path, "rb").read() for path in files) if data]
+        if not images:
+            raise ValueError("No JPEG found in %s" % frames)
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.camera = _Camera(images, processingTime, videoSize, sessionTimeout)
+        self.server.pictures = itertools.cycle(images)
+        self.server.latency = latency
+        self.server.bandwidth = bandwidth
+        self.server.errorRate = errorRate
+        self.server.fps = fps
+        self.server.random = random.Random(seed)
+        self.server.verbose = verbose
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        return self.server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> "Simulator":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "Simulator":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Simulate a Ricoh Theta S camera on the local network.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on. Default is 127.0.0.1 .')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on. Default is 8080.')
+    parser.add_argument('--frames', default=_defaultFrames, help='Directory of the JPEGs used for the pictures and the live preview.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay in seconds added to each request.')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='Throughput in bytes per second, 0 for no limit.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability for a request to fail.')
+    parser.add_argument('--processing-time', type=float, default=1.0, help='Time in seconds to process a picture.')
+    parser.add_argument('--fps', type=float, default=30.0, help='Frame rate of the live preview.')
+    parser.add_argument('--session-timeout', type=float, default=180.0, help='Time in seconds after which an idle session expires.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the error injection.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request.')
+    args = parser.parse_args()
+
+    simulator = Simulator(args.host, args.port, args.frames, args.latency, args.bandwidth,
+                          args.error_rate, args.processing_time, args.fps,
+                          sessionTimeout=args.session_timeout, seed=args.seed, verbose=args.verbose)
+    print(f"Simulated camera listening on {simulator.host}:{simulator.port}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
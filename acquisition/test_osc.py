@@ -0,0 +1,105 @@
+"""
+Tests of the Open Spherical Camera client against the simulated camera.
+
+    python3 -m pytest acquisition
+"""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+import osc
+import theta
+from simulator import Simulator
+
+
+@pytest.fixture
+def camera():
+    with Simulator(latency=0.001, processingTime=0.3) as simulator:
+        camera = theta.RicohThetaS(simulator.host, simulator.port)
+        yield camera
+        camera.closeSession()
+        camera.close()
+
+
+@pytest.mark.parametrize("useUpdates", [False, True])
+def test_wait_for_processing(camera, useUpdates):
+    camera.setCaptureMode("image")
+    response = camera.takePicture()
+    start = time.monotonic()
+    status = camera.waitForProcessing(response['id'], maxWait=3.0, useUpdates=useUpdates)
+    assert status is not None and status['state'] == "done"
+    assert status['results']['fileUri'] == camera.latestFileUri()
+    assert time.monotonic() - start < 2.0
+
+
+def test_wait_refreshes_the_volatile_options(camera):
+    camera.setCaptureMode("image")
+    before = camera.getOptions(["iso", "remainingPictures"])
+    for _ in range(3):
+        response = camera.takePicture()
+        camera.waitForProcessing(response['id'], maxWait=3.0, useUpdates=True)
+    assert "iso" in camera._options
+    assert "remainingPictures" not in camera._options
+    assert camera.getOption("remainingPictures") == before["remainingPictures"] - 3
+
+
+def test_set_options_evicts_the_dependent_options(camera):
+    camera.setCaptureMode("image")
+    camera.getOptions(["fileFormat", "iso"])
+    camera.setCaptureMode("_video")
+    assert "fileFormat" not in camera._options
+    assert camera.getOption("fileFormat")["type"] == "mp4"
+    assert camera.getCaptureMode() == "_video"
+
+
+def test_set_options_keeps_the_independent_options(camera):
+    camera.getOptions(["fileFormat", "iso"])
+    camera.setOption("whiteBalance", "daylight")
+    assert "fileFormat" in camera._options and "iso" in camera._options
+    camera.setOption("exposureProgram", 1)
+    assert "iso" not in camera._options and "fileFormat" in camera._options
+
+
+async def _asyncCapture(simulator):
+    from async_theta import AsyncRicohThetaS
+    async with AsyncRicohThetaS(simulator.host, simulator.port) as camera:
+        await camera.startSession()
+        await camera.setCaptureMode("image")
+        response = await camera.takePicture()
+        await camera.waitForProcessing(response['id'], maxWait=3.0)
+        await camera.closeSession()
+        return camera.processingStats()
+
+
+@pytest.mark.parametrize("client", ["sync", "async"])
+def test_processing_stats(client):
+    if client == "async":
+        pytest.importorskip("aiohttp")
+    with Simulator(latency=0.001, processingTime=0.5) as simulator:
+        if client == "async":
+            stats = asyncio.run(_asyncCapture(simulator))
+        else:
+            camera = theta.RicohThetaS(simulator.host, simulator.port)
+            camera.setCaptureMode("image")
+            response = camera.takePicture()
+            camera.waitForProcessing(response['id'], maxWait=3.0)
+            stats = camera.processingStats()
+            camera.closeSession()
+            camera.close()
+    # The end of the processing is noticed within the longest poll delay
+    assert stats["count"] == 1
+    assert 0.5 <= stats["max"] < 0.5 + 0.3
+
+
+def test_downloads_share_the_file_names(camera, tmp_path):
+    camera.setCaptureMode("image")
+    response = camera.takePicture()
+    fileUri = camera.waitForProcessing(response['id'], maxWait=3.0)['results']['fileUri']
+    (tmp_path / "single").mkdir()
+    assert camera.getImage(fileUri, dir=str(tmp_path / "single"))
+    assert camera.downloadFiles([fileUri], str(tmp_path / "many"))[fileUri]
+    assert os.listdir(tmp_path / "single") == os.listdir(tmp_path / "many") == [osc.localFileName(fileUri)]
+    assert osc.localFileName("DCIM/100RICOH/R0010001.JPG") == "R0010001.JPG"
@@ -0,0 +1,30 @@
+"""
+Tests of the synchronized capture against the simulated camera.
+
+    python3 -m pytest acquisition
+"""
+
+import time
+
+from rig import CameraRig
+from simulator import Simulator
+
+
+def test_keep_alive_keeps_the_session():
+    with Simulator(latency=0.001, processingTime=0.1, sessionTimeout=0.5) as simulator:
+        rig = CameraRig([simulator.host], simulator.port, keepAliveInterval=0.1)
+        time.sleep(1.2)
+        records = rig.takePicture()
+        rig.close()
+        assert records[0]['result']
+        assert simulator.server.camera.sessionCount == 1
+
+
+def test_expired_session_is_started_again():
+    with Simulator(latency=0.001, processingTime=0.1, sessionTimeout=0.2) as simulator:
+        rig = CameraRig([simulator.host], simulator.port, keepAliveInterval=0)
+        time.sleep(0.5)
+        records = rig.takePicture()
+        rig.close()
+        assert records[0]['response'] is not None and records[0]['result']
+        assert simulator.server.camera.sessionCount == 2
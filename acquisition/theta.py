@@ -24,20 +24,15 @@ https://github.com/codetricity/theta-s-api-tests/blob/master/thetapylib.py
 """
 
 import json
-import os
 import time
-import timeit
-import requests
-import cv2
-import numpy as np
-from image_processor import split_image
+from preview import LivePreviewPipeline
 import osc
 
 
 
 
 
-__all__ = ['g_ricohOptions', 'ricohFileFormats', 'RicohThetaS']
+__all__ = ['g_ricohOptions', 'g_ricohOptionDependents', 'g_ricohVolatileOptions', 'ricohFileFormats', 'RicohThetaS']
 
 #
 # Ricoh Theta S
@@ -62,6 +57,15 @@ g_ricohOptions = [
             "_HDMIresoSupport", "_shutterVolume", "_shutterVolumeSupport"
             ]
 
+# Read-only options never kept in the option cache
+g_ricohVolatileOptions = ["_remainingVideos"]
+
+# The filters (noise reduction, HDR) set the exposure themselves
+g_ricohOptionDependents = {
+            "_filter": ["exposureProgram", "exposureCompensation", "iso",
+                        "shutterSpeed", "whiteBalance"]
+            }
+
 ricohFileFormats = {
     "image_5k" : {'width': 5376, 'type': 'jpeg', 'height': 2688},
     "image_2k" : {'width': 2048, 'type': 'jpeg', 'height': 1024},
@@ -72,13 +76,23 @@ ricohFileFormats = {
 class RicohThetaS(osc.OpenSphericalCamera):
     # Class variables / methods
     ricohOptions = g_ricohOptions
+    ricohOptionDependents = g_ricohOptionDependents
+    ricohVolatileOptions = g_ricohVolatileOptions
 
-    def __init__(self, ip_base: str = "192.168.1.1", httpPort: int = 80) -> None:
-        osc.OpenSphericalCamera.__init__(self, ip_base, httpPort)
+    def __init__(self, ip_base: str = "192.168.1.1", httpPort: int = 80,
+                 poolSize: int = 4, timeout: float | tuple[float, float] = (5.0, 30.0),
+                 keepAlive: bool = True) -> None:
+        osc.OpenSphericalCamera.__init__(self, ip_base, httpPort, poolSize, timeout, keepAlive)
 
     def getOptionNames(self) -> list[str]:
         return self.oscOptions + self.ricohOptions
 
+    def getOptionDependents(self) -> dict:
+        return {**self.oscOptionDependents, **self.ricohOptionDependents}
+
+    def getVolatileOptions(self) -> list[str]:
+        return self.oscVolatileOptions + self.ricohVolatileOptions
+
     # 'image', '_video'
     def setCaptureMode(self, mode) -> dict | None:
         return self.setOption("captureMode", mode)
@@ -114,7 +128,7 @@ class RicohThetaS(osc.OpenSphericalCamera):
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -145,14 +159,14 @@ class RicohThetaS(osc.OpenSphericalCamera):
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera._finishWlan",
              "parameters": {
-                "sessionId": self.sid
+                "sessionId": self._sessionId()
              }
              })
         header = {"Content-Type": "application/json; charset=UTF-8", 
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -177,14 +191,14 @@ class RicohThetaS(osc.OpenSphericalCamera):
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera._startCapture",
              "parameters": {
-                "sessionId": self.sid
+                "sessionId": self._sessionId()
              }
              })
         header = {"Content-Type": "application/json; charset=UTF-8", 
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -206,14 +220,14 @@ class RicohThetaS(osc.OpenSphericalCamera):
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera._stopCapture",
              "parameters": {
-                "sessionId": self.sid
+                "sessionId": self._sessionId()
              }
              })
         header = {"Content-Type": "application/json; charset=UTF-8", 
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            req = requests.post(url, data=body, headers=header)
+            req = self._post(url, data=body, headers=header)
         except Exception as e:
             self._httpError(e)
             return None
@@ -235,7 +249,8 @@ class RicohThetaS(osc.OpenSphericalCamera):
         time.sleep(timeLimitSeconds)
         self.stopCapture()
 
-    def getVideo(self, fileUri: str, imageType: str = "full") -> bool:
+    def getVideo(self, fileUri: str, imageType: str = "full", dir: str = './',
+                 chunkSize: int = 1 << 20) -> bool:
         """
         Transfer the video file from the camera to computer and save the
         binary data to local storage.  This works, but is clunky.
@@ -259,24 +274,25 @@ class RicohThetaS(osc.OpenSphericalCamera):
                       "X-Content-Type-Options": "nosniff",
                       "X-XSRF-Protected": '1'}
   
-            fileName = fileUri.split("/")[1]
-
-            try:
-                response = requests.post(url, data=body, headers=header, stream=True)
-            except Exception as e:
-                self._httpError(e)
-                return acquired
-
-            if response.status_code == 200:
-                with open(fileName, 'wb') as handle:
-                    for block in response.iter_content(1024):
-                        handle.write(block)
-                acquired = True
-            else:
-                self._oscError(response)
+            fileName = osc.localFileName(fileUri)
+            d = dir + ('/' if not dir.endswith('/') else '')
+            acquired = self._saveStream(url, body, header, d + fileName, chunkSize)
 
         return acquired
 
+    def _downloadBody(self, fileUri: str) -> str:
+        """
+        Videos are transferred with camera._getVideo.
+        """
+        if fileUri.lower().endswith(".mp4"):
+            return json.dumps({"name": "camera._getVideo",
+                 "parameters": {
+                    "fileUri": fileUri,
+                    "type": "full"
+                 }
+                 })
+        return osc.OpenSphericalCamera._downloadBody(self, fileUri)
+
     def getLatestVideo(self, imageType: str = "full") -> None:
         """
         Transfer the latest file from the camera to computer and save the
@@ -288,13 +304,31 @@ class RicohThetaS(osc.OpenSphericalCamera):
         if fileUri:
             self.getVideo(fileUri, imageType)
 
-    def getLivePreview(self, dir: str = './') -> None:
+    def getLivePreview(self, dir: str = './', chunkSize: int = 8192,
+                       decodeWorkers: int = 2, writeWorkers: int = 2,
+                       queueSize: int = 8, dropOldest: bool = True,
+                       headless: bool = False, rearrange: bool | None = None) -> None:
         """
         Save the live preview video stream to disk as a series of jpegs. 
         The capture mode must be 'image'.
 
-        Credit for jpeg decoding:
-        https://stackoverflow.com/questions/21702477/how-to-parse-mjpeg-http-stream-from-ip-camera
+        chunkSize:
+                Integer Number of bytes read from the stream at once. The
+                frames are extracted by an incremental MjpegDemuxer.
+        decodeWorkers, writeWorkers:
+                Integer Number of threads decoding/rearranging and
+                encoding/writing the frames.
+        queueSize:
+                Integer Capacity of the queues between the stages.
+        dropOldest:
+                Boolean Drop the oldest frames when the processing falls
+                behind, instead of slowing down the reception.
+        headless:
+                Boolean Do not open any window. Without rearrangement the
+                frames are saved as received, without being decoded.
+        rearrange:
+                Boolean Also save the front and back views. Defaults to
+                True with a display and False when headless.
 
         Reference:
         https://developers.theta360.com/en/docs/v2/api_reference/commands/camera._get_live_preview.html
@@ -307,76 +341,27 @@ class RicohThetaS(osc.OpenSphericalCamera):
         url = self._request("commands/execute")
         body = json.dumps({"name": "camera._getLivePreview",
                 "parameters": {
-                    "sessionId": self.sid
+                    "sessionId": self._sessionId()
                  }})
 
         header = {"Content-Type": "application/json; charset=UTF-8", 
                   "X-Content-Type-Options": "nosniff",
                   "X-XSRF-Protected": '1'}
         try:
-            response = requests.post(url, data=body, headers=header, stream=True)
+            response = self._post(url, data=body, headers=header, stream=True)
         except Exception as e:
             self._httpError(e)
+            return
 
         if response.status_code == 200:
-            bytes_ = bytes()
-            # t0 = timeit.default_timer()
-            i = 0
-            for block in response.iter_content(1024):
-                bytes_ += block
-
-                # Search the current block of bytes for the jpg start and end
-                a = bytes_.find(b'\xff\xd8')
-                b = bytes_.find(b'\xff\xd9')
-
-                # If you have a jpg, write it to disk
-                if a !=- 1 and b != -1:
-                    fileNamePrefix = "livePreview"
-                    # print( "Writing frame %04d - Byte range : %d to %d" % (i, a, b) )
-                    # Found a jpg, write to disk
-                    if not os.path.exists(f"{dir}{fileNamePrefix}"):
-                        os.makedirs(f"{dir}{fileNamePrefix}")
-                    if not os.path.exists(f"{dir}back"):
-                        os.makedirs(f"{dir}back")
-                    if not os.path.exists(f"{dir}front"):
-                        os.makedirs(f"{dir}front")
-                    with open(f"{dir}{fileNamePrefix}/{fileNamePrefix}{i}.jpg", 'wb') as handler, \
-                        open(f"{dir}back/back{i}.jpg", 'wb') as handlerback, \
-                        open(f"{dir}front/front{i}.jpg", 'wb') as handlerfront:
-                        jpg = bytes_[a:b+2]
-
-                        img = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                        
-                        # Split the image 
-                        back_img, front_img = split_image(img) 
-                        back_back_img, front_back_img = split_image(back_img)
-                        back_front_img, front_front_img = split_image(front_img)
-
-                        back_concat = cv2.hconcat([front_back_img, back_front_img])
-                        front_concat = cv2.hconcat([front_front_img, back_back_img])
-
-                        cv2.imshow(fileNamePrefix+'Back', back_concat)
-                        cv2.imshow(fileNamePrefix+'Front',front_concat)
-                        cv2.imshow(fileNamePrefix, img)
-
-                        # press 'q' on the keyboard to close the windows
-                        if (cv2.waitKey(1) & 0xFF == ord('q')):
-                            break
-                        
-                        handlerback.write(cv2.imencode('.jpg', back_concat)[1])
-                        handlerfront.write(cv2.imencode('.jpg', front_concat)[1])
-                        handler.write(jpg)
-
-
-                        # Reset the buffer to point to the next set of bytes
-                        bytes_ = bytes_[b+2:]
-                        # print( "Wrote frame %04d - %2.3f seconds" % (i, elapsed) )
-
-                    i += 1
-                # t1 = timeit.default_timer()
-                # elapsed = t1 - t0
-                # t0 = t1
-                # print(f"{elapsed = } seconds")
+            if rearrange is None:
+                rearrange = not headless
+            pipeline = LivePreviewPipeline(dir, decodeWorkers, writeWorkers, queueSize, dropOldest,
+                                           display=not headless, rearrange=rearrange)
+            stats = pipeline.run(response.iter_content(chunkSize), onStop=response.close)
+            response.close()
+            print( "Live preview - %(received)d frames received, %(written)d written, "
+                   "%(dropped)d dropped" % stats )
         else:
             self._oscError(response)
 
@@ -10,11 +10,184 @@
 #                                                                              #
 # **************************************************************************** #
 
+import hashlib
+import os
+import time
 import cv2
 import numpy as np
-from typing import Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator, Optional, Sequence, Tuple
 
-def find_corners(images: list[str], checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], show: bool = False) -> Tuple[list[np.ndarray], list[np.ndarray], Tuple[int, int]]:
+
+# Camera models of calibrate_camera, and the views they need at least
+MODELS = ('pinhole', 'fisheye', 'omni')
+MIN_VIEWS = 3
+
+
+def _init_worker() -> None:
+    """
+    Keeps OpenCV on a single thread in each worker, the images are already
+    processed in parallel.
+    """
+    cv2.setNumThreads(1)
+
+
+def split_lens(img: np.ndarray, lens: Optional[int] = None) -> np.ndarray:
+    """
+    Keeps the half of a dual-lens frame showing one lens.
+
+    Args:
+    img: The frame.
+    lens: 0 for the left half (back lens), 1 for the right half (front
+    lens), None for the whole frame.
+
+    Returns:
+    img: The frame or its half.
+    """
+    if lens is None:
+        return img
+    half = img.shape[1] // 2
+    return img[:, :half] if lens == 0 else img[:, half:2 * half]
+
+
+def read_lens(fname: str, lens: Optional[int] = None) -> np.ndarray:
+    """
+    Reads an image, or the half of a dual-lens frame showing one lens.
+
+    Args:
+    fname: Path to the image.
+    lens: Lens to keep, see split_lens.
+
+    Returns:
+    img: The image or its half.
+    """
+    return split_lens(cv2.imread(fname), lens)
+
+
+def detect_corners(fname: str, checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], detect_size: int = 0, lens: Optional[int] = None) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+    """
+    Finds and refines the chessboard corners of a single image.
+
+    Args:
+    fname: Path to the image.
+    checkerboard: Number of internal corners per a chessboard row and column.
+    criteria: Criteria for the cornerSubPix algorithm.
+    detect_size: If positive, the chessboard is searched in the image
+    downscaled to this size on its longest side, then the corners are
+    refined at full resolution. Images without chessboard are rejected
+    at the low resolution.
+    lens: Lens of a dual-lens frame to search, see read_lens.
+
+    Returns:
+    corners: Refined corners, or None if the chessboard is not found.
+    img_shape: Shape of the grayscale image.
+    """
+    return detect_image_corners(read_lens(fname, lens), checkerboard, criteria, detect_size)
+
+
+def detect_image_corners(img: np.ndarray, checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], detect_size: int = 0) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+    """
+    Finds and refines the chessboard corners of an image already in memory,
+    see detect_corners.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    scale = max(gray.shape) / detect_size if detect_size > 0 else 1.0
+    if scale > 1.0:
+        small = cv2.resize(gray, (round(gray.shape[1] / scale), round(gray.shape[0] / scale)), interpolation=cv2.INTER_AREA)
+    else:
+        scale, small = 1.0, gray
+
+    # Find the chessboard corners in the image
+    ret, corners = cv2.findChessboardCorners(small, checkerboard,
+                                             cv2.CALIB_CB_ADAPTIVE_THRESH + 
+                                             cv2.CALIB_CB_FAST_CHECK + 
+                                             cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not ret:
+        return None, gray.shape[::-1]
+
+    # If corners are found, refine the corner positions
+    win = 3
+    if scale > 1.0:
+        # Refine at the low resolution first, the remaining error once
+        # upscaled is about a pixel of the small image
+        corners = cv2.cornerSubPix(small, corners, (3, 3), (-1, -1), criteria)
+        corners = (corners + 0.5) * np.float32(scale) - 0.5
+        win = max(win, int(np.ceil(scale)))
+    corners = cv2.cornerSubPix(gray, corners, (win, win), (-1, -1), criteria)
+    # Same layout whatever the OpenCV version, as the corners found in the cache
+    return corners.reshape(-1, 1, 2), gray.shape[::-1]
+
+
+def corner_key(fname: str, checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], detect_size: int = 0, lens: Optional[int] = None) -> str:
+    """
+    Key of the detection of the corners of an image: the hash of its content
+    and of the detection settings.
+
+    Args:
+    fname: Path to the image.
+    checkerboard: Number of internal corners per a chessboard row and column.
+    criteria: Criteria for the cornerSubPix algorithm.
+    detect_size: Size of the downscaled images, see detect_corners.
+    lens: Lens of a dual-lens frame, see read_lens.
+
+    Returns:
+    key: Hexadecimal SHA-1 digest.
+    """
+    digest = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(repr((tuple(checkerboard), tuple(criteria), detect_size, lens)).encode())
+    return digest.hexdigest()
+
+
+def load_corner_cache(path: str) -> dict:
+    """
+    Loads the corners detected by previous runs.
+
+    Args:
+    path: Path to the cache file, it may not exist yet.
+
+    Returns:
+    cache: Corners, or None when no chessboard was found, and shape of the
+    image by key, see corner_key.
+    """
+    cache = {}
+    if not os.path.exists(path):
+        return cache
+    with np.load(path) as data:
+        keys, counts, shapes, corners = data['keys'], data['counts'], data['shapes'], data['corners']
+    # The corners of all the images are concatenated, count 0 means no chessboard
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    for i, key in enumerate(keys):
+        points = corners[offsets[i]:offsets[i + 1]].reshape(-1, 1, 2) if counts[i] else None
+        cache[str(key)] = (points, tuple(int(n) for n in shapes[i]))
+    return cache
+
+
+def save_corner_cache(path: str, cache: dict) -> None:
+    """
+    Saves the detected corners as a single compact file, see load_corner_cache.
+
+    Args:
+    path: Path to the cache file.
+    cache: Corners and shape of the image by key.
+    """
+    keys = list(cache)
+    counts = np.array([0 if cache[key][0] is None else len(cache[key][0]) for key in keys], dtype=np.int32)
+    shapes = np.array([cache[key][1] for key in keys], dtype=np.int32).reshape(-1, 2)
+    corners = [cache[key][0].reshape(-1, 2) for key in keys if cache[key][0] is not None]
+    corners = np.concatenate(corners).astype(np.float32) if corners else np.empty((0, 2), np.float32)
+    # Written aside then renamed, so that an interrupted run keeps the previous cache
+    with open(path + '.part', 'wb') as f:
+        np.savez(f, keys=np.array(keys, dtype='U40'), counts=counts, shapes=shapes, corners=corners)
+    os.replace(path + '.part', path)
+
+
+def find_corners(images: list[str], checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], show: bool = False, jobs: int = 1, detect_size: int = 0, cache: Optional[str] = None, lens: Optional[int] = None) -> Tuple[list[np.ndarray], list[np.ndarray], Tuple[int, int]]:
     """
     Finds the corners in the provided images for camera calibration.
 
@@ -22,12 +195,19 @@ def find_corners(images: list[str], checkerboard: Tuple[int, int], criteria: Tup
     images: List of paths to the images containing the checkerboard pattern.
     checkerboard: Number of internal corners per a chessboard row and column.
     criteria: Criteria for the cornerSubPix algorithm.
+    show: Whether to display the images with found corners.
+    jobs: Number of processes detecting the corners. The results keep the
+    order of the images whatever the number of processes.
+    detect_size: Size of the downscaled images the chessboard is searched
+    in, 0 to search at full resolution. See detect_corners.
+    cache: Path to a file keeping the corners between runs, only the images
+    which are new or whose content or settings changed are processed.
+    lens: Lens of dual-lens frames to search, see read_lens.
 
     Returns:
     objpoints: List of 3D points in real-world space for each checkerboard image.
     imgpoints: List of 2D points in image plane for each checkerboard image.
     img_shape: Shape of the grayscale image used for calibration.
-    show: Whether to display the images with found corners.
     """
     # List to store 3D and 2D points for each image
     objpoints: list[np.ndarray] = []
@@ -36,42 +216,342 @@ def find_corners(images: list[str], checkerboard: Tuple[int, int], criteria: Tup
     # Prepare a single set of 3D points for the checkerboard pattern
     objp = np.zeros((1, checkerboard[0] * checkerboard[1], 3), np.float32)
     objp[0, :, :2] = np.mgrid[0:checkerboard[0], 0:checkerboard[1]].T.reshape(-1, 2)
-    
-    # Iterate through each image to find chessboard corners
-    for fname in images:
-        #print(f"{fname = }")
-        img = cv2.imread(fname)  
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-        # Find the chessboard corners in the image
-        ret, corners = cv2.findChessboardCorners(gray, checkerboard,
-                                                 cv2.CALIB_CB_ADAPTIVE_THRESH + 
-                                                 cv2.CALIB_CB_FAST_CHECK + 
-                                                 cv2.CALIB_CB_NORMALIZE_IMAGE)
-
-        # If corners are found, refine the corner positions and store the points
-        
-        if ret:
-            print(fname)
+
+    known = load_corner_cache(cache) if cache else {}
+    keys = [corner_key(fname, checkerboard, criteria, detect_size, lens) for fname in images] if cache else [None] * len(images)
+    missing = [i for i, key in enumerate(keys) if key not in known]
+    todo = [images[i] for i in missing]
+
+    # The images are independent, detect their corners in parallel
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as executor:
+            detected = list(executor.map(detect_corners, todo, repeat(checkerboard), repeat(criteria),
+                                         repeat(detect_size), repeat(lens), chunksize=max(1, len(todo) // (4 * jobs))))
+    else:
+        detected = [detect_corners(fname, checkerboard, criteria, detect_size, lens) for fname in todo]
+
+    if cache:
+        if todo:
+            print(f"{len(todo)} image(s) processed, {len(images) - len(todo)} found in the cache")
+            known.update((keys[i], result) for i, result in zip(missing, detected))
+            save_corner_cache(cache, known)
+        results = [known[key] for key in keys]
+    else:
+        results = detected
+
+    # Store the points of the images where the chessboard was found
+    img_shape = None
+    for fname, (corners2, img_shape) in zip(images, results):
+        if corners2 is None:
+            continue
+        print(fname)
+        objpoints.append(objp)
+        imgpoints.append(corners2)
+
+        # Optionally, draw and display the corners
+        if show:
+            img = cv2.drawChessboardCorners(read_lens(fname, lens).copy(), checkerboard, corners2, True)
+            cv2.namedWindow('img', cv2.WINDOW_NORMAL)
+            cv2.imshow('img', img)
+            cv2.waitKey(0)
+            cv2.destroyAllWindows()
+
+    return objpoints, imgpoints, img_shape
+
+
+def video_frames(video: str, stride: int = 1, min_change: float = 0) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Reads the frames of a video to search the chessboard in, without
+    writing anything to the disk.
+
+    Args:
+    video: Path to the video.
+    stride: Only every stride-th frame is kept. The frames in between are
+    grabbed but never converted to images.
+    min_change: Mean difference, in gray levels, of a small thumbnail of a
+    frame with the one of the last frame kept, below which the frame is
+    skipped as a near duplicate, e.g. while the board does not move. 0 keeps
+    every stride-th frame.
+
+    Returns:
+    frames: Generator of the number of each frame kept and its image.
+    """
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise IOError(f"Could not open the video {video}")
+    last = None
+    number = -1
+    try:
+        while True:
+            # grab only demuxes and decodes, retrieve converts the frame
+            for _ in range(stride):
+                if not cap.grab():
+                    return
+                number += 1
+            ret, frame = cap.retrieve()
+            if not ret:
+                return
+            if min_change > 0:
+                thumbnail = cv2.cvtColor(cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY).astype(np.float32)
+                if last is not None and cv2.norm(thumbnail, last, cv2.NORM_L1) / thumbnail.size < min_change:
+                    continue
+                last = thumbnail
+            yield number, frame
+    finally:
+        cap.release()
+
+
+def _detect_frame(frame: np.ndarray, checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], detect_size: int, lenses: Sequence[Optional[int]]) -> list:
+    """
+    Detects the corners of each lens of a video frame, see detect_image_corners.
+    """
+    return [detect_image_corners(split_lens(frame, lens), checkerboard, criteria, detect_size) for lens in lenses]
+
+
+def find_corners_video(video: str, checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], show: bool = False, jobs: int = 1, detect_size: int = 0, stride: int = 1, min_change: float = 0, lenses: Sequence[Optional[int]] = (None,)) -> dict:
+    """
+    Finds the corners in the frames of a video, streamed from the decoder to
+    the detection without intermediate images.
+
+    Args:
+    video: Path to the video.
+    checkerboard: Number of internal corners per a chessboard row and column.
+    criteria: Criteria for the cornerSubPix algorithm.
+    show: Whether to display the frames with found corners.
+    jobs: Number of processes detecting the corners, while the video is read.
+    detect_size: Size of the downscaled images, see detect_corners.
+    stride, min_change: Sampling of the frames, see video_frames.
+    lenses: Lenses of dual-lens frames to search, see split_lens. Every frame
+    is decoded once whatever the number of lenses.
+
+    Returns:
+    corners: objpoints, imgpoints and img_shape, as returned by find_corners,
+    by lens.
+    """
+    objp = np.zeros((1, checkerboard[0] * checkerboard[1], 3), np.float32)
+    objp[0, :, :2] = np.mgrid[0:checkerboard[0], 0:checkerboard[1]].T.reshape(-1, 2)
+    found = {lens: ([], [], None) for lens in lenses}
+
+    def store(number: int, frame: Optional[np.ndarray], results: list) -> None:
+        for lens, (corners2, img_shape) in zip(lenses, results):
+            objpoints, imgpoints, _ = found[lens]
+            found[lens] = objpoints, imgpoints, img_shape
+            if corners2 is None:
+                continue
+            print(f"{video} frame {number}" + ("" if lens is None else f" lens {lens}"))
             objpoints.append(objp)
-            corners2 = cv2.cornerSubPix(gray, corners, (3, 3), (-1, -1), criteria)
             imgpoints.append(corners2)
-
-            # Optionally, draw and display the corners
             if show:
-                img = cv2.drawChessboardCorners(img, checkerboard, corners2, ret)
+                img = cv2.drawChessboardCorners(split_lens(frame, lens).copy(), checkerboard, corners2, True)
                 cv2.namedWindow('img', cv2.WINDOW_NORMAL)
                 cv2.imshow('img', img)
                 cv2.waitKey(0)
                 cv2.destroyAllWindows()
+
+    frames = video_frames(video, stride, min_change)
+    if jobs > 1:
+        # Only a few frames are in flight at once, the video is never held in memory
+        pending: deque = deque()
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as executor:
+            for number, frame in frames:
+                if len(pending) >= 2 * jobs:
+                    done_number, done_frame, future = pending.popleft()
+                    store(done_number, done_frame, future.result())
+                future = executor.submit(_detect_frame, frame, checkerboard, criteria, detect_size, lenses)
+                pending.append((number, frame if show else None, future))
+            while pending:
+                done_number, done_frame, future = pending.popleft()
+                store(done_number, done_frame, future.result())
+    else:
+        for number, frame in frames:
+            store(number, frame, _detect_frame(frame, checkerboard, criteria, detect_size, lenses))
+    return found
+
+
+def compare_detection(images: list[str], checkerboard: Tuple[int, int], criteria: Tuple[int, int, float], detect_size: int) -> dict:
+    """
+    Compares the detection at full resolution with the detection on
+    downscaled images, see detect_corners.
+
+    Args:
+    images: List of paths to the images containing the checkerboard pattern.
+    checkerboard: Number of internal corners per a chessboard row and column.
+    criteria: Criteria for the cornerSubPix algorithm.
+    detect_size: Size of the downscaled images.
+
+    Returns:
+    report: Time of each mode, speedup, number of chessboards found by each
+    mode and distance in pixels between the corners found by both.
+    """
+    report = {}
+    results = {}
+    for name, size in (('full', 0), ('downscaled', detect_size)):
+        start = time.perf_counter()
+        results[name] = [detect_corners(fname, checkerboard, criteria, size)[0] for fname in images]
+        report[f"{name}_seconds"] = time.perf_counter() - start
+        report[f"{name}_found"] = sum(corners is not None for corners in results[name])
+    report['speedup'] = report['full_seconds'] / report['downscaled_seconds']
+
+    # findChessboardCorners may order the grid from either end, the
+    # detections are compared in the order which matches them best
+    distances = [min((np.linalg.norm(full - candidate, axis=-1).ravel() for candidate in (downscaled, downscaled[::-1])),
+                     key=lambda distance: distance.mean())
+                 for full, downscaled in zip(results['full'], results['downscaled'])
+                 if full is not None and downscaled is not None]
+    if distances:
+        distances = np.concatenate(distances)
+        report['mean_distance_px'] = float(distances.mean())
+        report['max_distance_px'] = float(distances.max())
+    return report
+
+
+def _fisheye_flag(name: str) -> int:
+    """
+    Flag of cv2.fisheye, which OpenCV 5 moved to the main namespace.
+    """
+    flag = getattr(cv2.fisheye, name, None)
+    return getattr(cv2, name) if flag is None else flag
+
+
+def _fisheye_calibrate(objpoints: list[np.ndarray], imgpoints: list[np.ndarray], img_shape: Tuple[int, int], criteria: Tuple[int, int, float]) -> tuple:
+    """
+    Runs cv2.fisheye.calibrate, which fails outright on views it cannot
+    initialise or condition. When it does, the views whose extrinsics
+    cannot be initialised on their own are left out, then the model is
+    solved again with the first two distortion coefficients only, which
+    converges on harder datasets. Returns its results and the indices of
+    the views used.
+
+    Raises:
+    ValueError: If the model cannot be fitted.
+    """
+    flags = _fisheye_flag('CALIB_RECOMPUTE_EXTRINSIC') + _fisheye_flag('CALIB_FIX_SKEW')
+    used = list(range(len(objpoints)))
+    try:
+        return cv2.fisheye.calibrate(objpoints, imgpoints, img_shape, None, None, flags=flags, criteria=criteria), used
+    except cv2.error as e:
+        error = e
+
+    dropped = []
+    for v in used:
+        try:
+            cv2.fisheye.calibrate([objpoints[v]], [imgpoints[v]], img_shape, None, None,
+                                  flags=flags, criteria=(cv2.TERM_CRITERIA_COUNT, 1, 0))
+        except cv2.error as e:
+            if 'InitExtrinsics' in str(e):
+                dropped.append(v)
+    if dropped:
+        print(f"{len(dropped)} view(s) left out by the fisheye model: {dropped}")
+        used = [v for v in used if v not in dropped]
+
+    for retry in (flags, flags + _fisheye_flag('CALIB_FIX_K3') + _fisheye_flag('CALIB_FIX_K4')):
+        if len(used) < MIN_VIEWS:
+            break
+        try:
+            results = cv2.fisheye.calibrate([objpoints[v] for v in used], [imgpoints[v] for v in used], img_shape, None, None,
+                                            flags=retry, criteria=criteria)
+        except cv2.error as e:
+            error = e
+            continue
+        if retry != flags:
+            print("The fisheye model is solved with k3 = k4 = 0")
+        return results, used
+    raise ValueError(f"The fisheye model could not be fitted on these {len(objpoints)} views, try the omni model. "
+                     f"OpenCV: {str(error).strip()}")
+
+
+def select_views(imgpoints: list[np.ndarray], img_shape: Tuple[int, int], checkerboard: Tuple[int, int], max_views: int) -> list[int]:
+    """
+    Picks a subset of views as different as possible from each other, e.g.
+    among the near-duplicate frames of a video. Each view is described by
+    the positions of the four outer corners of its board, which reflect the
+    area covered as well as the distance and the tilt of the board. The
+    views are picked by farthest point sampling, from the largest board.
+
+    Args:
+    imgpoints: List of 2D points in image plane for each checkerboard image.
+    img_shape: Shape of the grayscale image used for calibration.
+    checkerboard: Number of internal corners per a chessboard row and column.
+    max_views: Number of views to pick.
+
+    Returns:
+    selected: Sorted indices of the picked views, all of them if there are
+    no more than max_views.
+    """
+    if max_views <= 0 or len(imgpoints) <= max_views:
+        return list(range(len(imgpoints)))
+    n = checkerboard[0] * checkerboard[1]
+    outer = np.array([np.asarray(points, np.float64).reshape(-1, 2)[[0, checkerboard[0] - 1, n - checkerboard[0], n - 1]]
+                      for points in imgpoints])
+    features = (outer / np.array(img_shape, np.float64)).reshape(len(imgpoints), -1)
+    areas = [cv2.contourArea(cv2.convexHull(corners.astype(np.float32))) for corners in outer]
+
+    selected = [int(np.argmax(areas))]
+    distance = np.linalg.norm(features - features[selected[0]], axis=1)
+    while len(selected) < max_views:
+        farthest = int(np.argmax(distance))
+        selected.append(farthest)
+        distance = np.minimum(distance, np.linalg.norm(features - features[farthest], axis=1))
+    return sorted(selected)
+
+
+def _solve(objpoints: list[np.ndarray], imgpoints: list[np.ndarray], img_shape: Tuple[int, int], model: str) -> tuple:
+    """
+    Runs the solver of the model once, see calibrate_camera. Returns the
+    RMS error, the parameters and the indices of the views it used.
+    """
+    used = list(range(len(objpoints)))
+    if model == 'pinhole':
+        rms, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, img_shape, None, None)
+        csi = 0.0
+    else:
+        # Both models expect 1xN points in double precision
+        objpoints = [np.asarray(o, np.float64).reshape(1, -1, 3) for o in objpoints]
+        imgpoints = [np.asarray(i, np.float64).reshape(1, -1, 2) for i in imgpoints]
+        criteria = (cv2.TERM_CRITERIA_COUNT + cv2.TERM_CRITERIA_EPS, 200, 1e-8)
+        if model == 'fisheye':
+            (rms, mtx, dist, rvecs, tvecs), used = _fisheye_calibrate(objpoints, imgpoints, img_shape, criteria)
+            csi = None
+        elif model == 'omni':
+            rms, mtx, xi, dist, rvecs, tvecs, idx = cv2.omnidir.calibrate(objpoints, imgpoints, img_shape, None, None, None,
+                                                                          cv2.omnidir.CALIB_FIX_SKEW, criteria)
+            # Views which fail the initialisation are left out
+            used = [] if idx is None else [int(i) for i in np.ravel(idx)]
+            csi = float(np.ravel(xi)[0])
         else:
-            #print(f"{fname}")
-            ()
+            raise ValueError(f"Unknown camera model: {model}")
+    return rms, mtx, dist, list(rvecs), list(tvecs), csi, used
+
 
+def view_errors(objpoints: list[np.ndarray], imgpoints: list[np.ndarray], mtx: np.ndarray, dist: np.ndarray, rvecs: list[np.ndarray], tvecs: list[np.ndarray], csi: Optional[float], model: str = 'pinhole') -> np.ndarray:
+    """
+    Computes the reprojection error of each view.
 
-    return objpoints, imgpoints, gray.shape[::-1]
+    Args:
+    objpoints: List of 3D points in real-world space for each view.
+    imgpoints: List of 2D points in image plane for each view.
+    mtx, dist, rvecs, tvecs, csi: Parameters returned by calibrate_camera
+    for these views.
+    model: Camera model of the parameters.
 
-def calibrate_camera(objpoints: list[np.ndarray], imgpoints: list[np.ndarray], img_shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, list[np.ndarray], list[np.ndarray]]:
+    Returns:
+    errors: RMS distance in pixels between the detected and the reprojected
+    corners, for each view.
+    """
+    errors = np.empty(len(objpoints))
+    for v, (o, i, rvec, tvec) in enumerate(zip(objpoints, imgpoints, rvecs, tvecs)):
+        o = np.asarray(o, np.float64).reshape(1, -1, 3)
+        if model == 'pinhole':
+            projected, _ = cv2.projectPoints(o, rvec, tvec, mtx, dist)
+        elif model == 'fisheye':
+            projected, _ = cv2.fisheye.projectPoints(o, rvec, tvec, mtx, dist)
+        else:
+            projected, _ = cv2.omnidir.projectPoints(o, rvec, tvec, mtx, csi, dist)
+        errors[v] = np.sqrt(np.mean(np.sum((projected.reshape(-1, 2) - np.asarray(i).reshape(-1, 2)) ** 2, axis=1)))
+    return errors
+
+
+def calibrate_camera(objpoints: list[np.ndarray], imgpoints: list[np.ndarray], img_shape: Tuple[int, int], model: str = 'pinhole', reject: float = 0, rounds: int = 5) -> Tuple[np.ndarray, np.ndarray, list[np.ndarray], list[np.ndarray], float, float]:
     """
     Performs camera calibration given object points and image points.
 
@@ -79,16 +559,56 @@ def calibrate_camera(objpoints: list[np.ndarray], imgpoints: list[np.ndarray], i
     objpoints: List of 3D points in real-world space for each checkerboard image.
     imgpoints: List of 2D points in image plane for each checkerboard image.
     img_shape: Shape of the grayscale image used for calibration.
+    model: 'pinhole' (cv2.calibrateCamera), 'fisheye' (cv2.fisheye, the
+    equidistant model with 4 coefficients) or 'omni' (cv2.omnidir, the
+    unified model of the projection code with its mirror parameter csi).
+    reject: Views whose reprojection error is more than this factor times
+    the median error of the views are left out and the camera calibrated
+    again, 0 to keep all of them.
+    rounds: Maximum number of calibrations when rejecting views.
 
     Returns:
     mtx: Camera matrix.
     dist: Distortion coefficients.
-    rvecs: List of rotation vectors estimated for each pattern view.
-    tvecs: List of translation vectors estimated for each pattern view.
+    rvecs: List of rotation vectors estimated for each pattern view kept.
+    tvecs: List of translation vectors estimated for each pattern view kept.
+    csi: Mirror parameter, 0 for the pinhole model and None for the fisheye one.
+    rms: RMS reprojection error.
+
+    Raises:
+    ValueError: If the model is unknown, there are fewer than MIN_VIEWS views
+    or the model cannot be fitted on them.
     """
-    _, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, img_shape, None, None)
-    print(len(rvecs))
-    return mtx, dist, rvecs, tvecs
+    if model not in MODELS:
+        raise ValueError(f"Unknown camera model: {model}")
+    if len(objpoints) < MIN_VIEWS:
+        raise ValueError(f"The {model} model needs at least {MIN_VIEWS} views with a detected chessboard, "
+                         f"{len(objpoints)} found")
+    solved = _solve(objpoints, imgpoints, img_shape, model)
+    # The omni solver may leave views out, only keep those it used
+    views = solved[-1]
+    for _ in range(rounds - 1 if reject > 0 else 0):
+        rms, mtx, dist, rvecs, tvecs, csi, _ = solved
+        errors = view_errors([objpoints[v] for v in views], [imgpoints[v] for v in views], mtx, dist, rvecs, tvecs, csi, model)
+        keep = errors <= reject * np.median(errors)
+        # Never go below the handful of views the solvers need
+        if keep.all() or keep.sum() < 4:
+            break
+        kept = [v for v, k in zip(views, keep) if k]
+        try:
+            retry = _solve([objpoints[v] for v in kept], [imgpoints[v] for v in kept], img_shape, model)
+        except (cv2.error, ValueError):
+            break
+        # A solver which did not converge gets no better without its worst views
+        if retry[0] >= rms:
+            break
+        print(f"{len(views) - len(kept)} view(s) rejected, reprojection errors above {reject * np.median(errors):.3f} px")
+        solved, views = retry, [kept[u] for u in retry[-1]]
+    rms, mtx, dist, rvecs, tvecs, csi, _ = solved
+    print(f"{len(views)} views used out of {len(objpoints)}")
+    print(f"RMS reprojection error: {rms}")
+    return mtx, dist, rvecs, tvecs, csi, rms
+
 
 if __name__ == '__main__':
     ()
\ No newline at end of file
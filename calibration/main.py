@@ -1,9 +1,11 @@
 
 import argparse
 import glob
+import os
 import cv2
 import numpy as np
 import calibration
+import store
 
 
 def main() -> None:
@@ -12,17 +14,31 @@ def main() -> None:
     """
     
     parser = argparse.ArgumentParser(description='Perform camera calibration on a set of images.')
-    parser.add_argument('dataset', help='Path to the dataset of images.')
+    parser.add_argument('dataset', help='Path to the dataset of images, or to a video whose frames are read directly.')
     parser.add_argument('--show', action='store_true', help='Display the images with found corners.')
     parser.add_argument('-r', '--row', type=int, default=5, help='Number of row of the chessboard used for the calibration. It should be nb_row - 1.')
     parser.add_argument('-c', '--column', type=int, default=9, help='Number of column of the chessboard used for the calibration. It should be nb_col - 1.')
+    parser.add_argument('--detect-size', type=int, default=0, help='Search the chessboard in the images downscaled to this size on their longest side, then refine the corners at full resolution. Default is 0, to search at full resolution.')
+    parser.add_argument('--compare', action='store_true', help='With --detect-size, only report the speedup and the corner differences against the full resolution detection.')
+    parser.add_argument('--model', choices=calibration.MODELS, default='pinhole', help="Camera model: 'pinhole', 'fisheye' (equidistant) or 'omni' (unified model with the mirror parameter csi, used by the projection). Default is pinhole.")
+    parser.add_argument('--dual', action='store_true', help='The images are dual-lens frames, calibrate the back (left half) and front (right half) lenses independently.')
+    parser.add_argument('--max-views', type=int, default=0, help='Calibrate on at most this number of views, picked to cover the image and the poses of the board as evenly as possible, e.g. among the frames of a video. Default is 0, to use all of them.')
+    parser.add_argument('--reject', type=float, default=0, help='Calibrate again without the views whose reprojection error is more than this factor times the median one, e.g. 3. Default is 0, to keep all of them.')
+    parser.add_argument('--stride', type=int, default=1, help='With a video, search the chessboard in every stride-th frame only. Default is 1.')
+    parser.add_argument('--min-change', type=float, default=0, help='With a video, skip the frames which differ from the last frame searched by less than this mean number of gray levels, e.g. 4. Default is 0, to search every stride-th frame.')
+    parser.add_argument('--store', help='Calibration store to save the lenses in, as back and front with --dual and as main otherwise, see store.py. The .npz files are written in any case.')
+    parser.add_argument('--serial', help='Serial number of the camera, kept with its lenses in the calibration store.')
+    parser.add_argument('--no-cache', action='store_true', help='Detect the corners of every image, without reading nor updating the cache of the previous runs.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of processes detecting the corners. Default is the number of CPUs.')
     args = parser.parse_args()
 
-    if not args.dataset.endswith('/'):
-        print("Error : The provided dataset must be a valid directory and his path must end with '/'.")
+    video = os.path.isfile(args.dataset)
+    if not video and not args.dataset.endswith('/'):
+        print("Error : The provided dataset must be a valid directory and his path must end with '/', or a video.")
         return
-    files = args.dataset + '*'
-    images: list[str] = glob.glob(files)
+    # The results are saved next to the dataset
+    name = os.path.splitext(args.dataset)[0] if video else args.dataset[:-1]
+    images: list[str] = [] if video else sorted(glob.glob(args.dataset + '*'))
 
     # Defining the dimensions of the checkerboard
     checkerboard = args.row, args.column
@@ -30,26 +46,70 @@ def main() -> None:
     # Termination criteria for the iterative algorithm used to refine the corner positions
     criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
-    objpoints, imgpoints, img_shape = calibration.find_corners(images, checkerboard, criteria, args.show)
-
-    mtx, dist, rvecs, tvecs = calibration.calibrate_camera(objpoints, imgpoints, img_shape)
-
+    if args.compare:
+        if video:
+            print("Error : --compare needs a dataset of images.")
+            return
+        report = calibration.compare_detection(images, checkerboard, criteria, args.detect_size)
+        print("\n Detection on downscaled images:")
+        for key, value in report.items():
+            print(f"{key}: {value}")
+        return
 
-    print("\n Dimensions:")
-    print(img_shape)
-
-    print("\n Camera matrix:") 
-    print(mtx) 
-    
-    print("\n Distortion coefficient:") 
-    print(dist) 
-    
-    print("\n Rotation Vectors:") 
-    print(rvecs) 
-    
-    print("\n Translation Vectors:") 
-    print(tvecs) 
-    np.savez(f"{args.dataset[:-1]}", mtx=mtx, dist=dist, rvecs=rvecs, tvecs=tvecs)
+    # Each lens of dual-lens frames is calibrated on its own
+    lenses = [(0, '_back'), (1, '_front')] if args.dual else [(None, '')]
+    if video:
+        # Every frame is decoded once for all the lenses
+        found = calibration.find_corners_video(args.dataset, checkerboard, criteria, args.show, args.jobs, args.detect_size,
+                                               args.stride, args.min_change, [lens for lens, _ in lenses])
+    for lens, suffix in lenses:
+        if args.dual:
+            print(60 * "=")
+            print(f"Calibrating the {suffix[1:]} lens...")
+
+        if video:
+            objpoints, imgpoints, img_shape = found[lens]
+        else:
+            objpoints, imgpoints, img_shape = calibration.find_corners(images, checkerboard, criteria, args.show, args.jobs, args.detect_size,
+                                                                       None if args.no_cache else f"{name}_corners.npz", lens)
+
+        if args.max_views > 0 and len(imgpoints) > args.max_views:
+            selected = calibration.select_views(imgpoints, img_shape, checkerboard, args.max_views)
+            print(f"{len(selected)} views selected out of {len(imgpoints)}")
+            objpoints = [objpoints[i] for i in selected]
+            imgpoints = [imgpoints[i] for i in selected]
+
+        try:
+            mtx, dist, rvecs, tvecs, csi, rms = calibration.calibrate_camera(objpoints, imgpoints, img_shape, args.model, args.reject)
+        except ValueError as e:
+            print(f"Error : {e}")
+            continue
+
+
+        print("\n Dimensions:")
+        print(img_shape)
+
+        print("\n Camera matrix:") 
+        print(mtx) 
+
+        print("\n Distortion coefficient:") 
+        print(dist) 
+
+        if csi is not None:
+            print("\n Mirror parameter (csi):")
+            print(csi)
+
+        print("\n Rotation Vectors:") 
+        print(rvecs) 
+
+        print("\n Translation Vectors:") 
+        print(tvecs) 
+        # K, D, csi and model are read by the projection code
+        np.savez(f"{name}{suffix}", mtx=mtx, dist=dist, rvecs=rvecs, tvecs=tvecs,
+                 K=mtx, D=dist, csi=0.0 if csi is None else csi, model=args.model)
+        if args.store:
+            store.save_lens(args.store, suffix[1:] or 'main', mtx, dist, csi, args.model, rms, img_shape, checkerboard,
+                            args.serial, rvecs, tvecs)
 
     # To use these data :
     
@@ -57,9 +117,16 @@ def main() -> None:
 
     # mtx = data['mtx']
     # dist = data['dist']
+    # csi = float(data['csi'])
+    # model = str(data['model'])
     # rvecs = data['rvecs']
     # tvecs = data['tvecs']
 
+    # or, from a calibration store :
+
+    # calibration = store.load_lens("path_of_store", "back")
+    # mtx, dist, csi = calibration['K'], calibration['D'], calibration['csi']
+
 
 
     
@@ -0,0 +1,227 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    store.py                                           :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/10/01 10:12:37 by abrar             #+#    #+#              #
+#    Updated: 2024/10/01 10:12:37 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Calibration store: a directory holding the calibration of each lens, the
+remap tables derived from them and their metadata.
+
+    meta.json               version, lenses (model, csi, rms, board,
+                            image size, serial of the camera, ...) and remaps
+    lenses/<lens>_K.npy     camera matrix, likewise _D, _rvecs and _tvecs
+    remaps/<name>_map1.npy  remap tables, likewise _map2
+
+Every array is a plain .npy file, so the remap tables are memory-mapped
+rather than read: the processes projecting the images share them through
+the page cache. Every file is written aside then renamed, readers never see
+a partial file.
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+__all__ = ['STORE_VERSION', 'read_meta', 'save_lens', 'load_lens', 'save_remap', 'load_remap', 'import_npz']
+
+# Version of the layout, stores of a newer version are refused
+STORE_VERSION = 1
+
+
+def _replace(path: str, write) -> None:
+    """
+    Writes a file aside with write(handle), then renames it.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.part', 'wb') as handle:
+        write(handle)
+    os.replace(path + '.part', path)
+
+
+def read_meta(path: str) -> dict:
+    """
+    Reads the metadata of a store.
+
+    Args:
+    path: Directory of the store, it may not exist yet.
+
+    Returns:
+    meta: The metadata, with the keys 'version', 'lenses' and 'remaps'.
+    """
+    meta_path = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_path):
+        return {'version': STORE_VERSION, 'lenses': {}, 'remaps': {}}
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('version', 0) > STORE_VERSION:
+        raise ValueError(f"{path} is a calibration store of version {meta['version']}, this code reads up to version {STORE_VERSION}")
+    meta.setdefault('lenses', {})
+    meta.setdefault('remaps', {})
+    return meta
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    meta['version'] = STORE_VERSION
+    meta['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    _replace(os.path.join(path, 'meta.json'), lambda handle: handle.write(json.dumps(meta, indent=2).encode()))
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    _replace(path, lambda handle: np.save(handle, np.ascontiguousarray(array)))
+
+
+def save_lens(path: str, lens: str, mtx: np.ndarray, dist: np.ndarray, csi: Optional[float], model: str, rms: Optional[float] = None, image_size: Optional[Tuple[int, int]] = None, board: Optional[Tuple[int, int]] = None, serial: Optional[str] = None, rvecs: Optional[list[np.ndarray]] = None, tvecs: Optional[list[np.ndarray]] = None) -> None:
+    """
+    Saves the calibration of a lens, replacing the previous one.
+
+    Args:
+    path: Directory of the store, created if needed.
+    lens: Name of the lens, e.g. 'back' or 'front'.
+    mtx, dist, rvecs, tvecs, csi: Results of calibration.calibrate_camera.
+    model: Camera model of the calibration, 'pinhole', 'fisheye' or 'omni'.
+    rms: RMS reprojection error of the calibration.
+    image_size: Width and height of the images of the lens.
+    board: Number of internal corners per a chessboard row and column.
+    serial: Serial number of the camera the lens belongs to.
+    """
+    prefix = os.path.join(path, 'lenses', lens)
+    _save_array(prefix + '_K.npy', np.asarray(mtx, np.float64).reshape(3, 3))
+    _save_array(prefix + '_D.npy', np.asarray(dist, np.float64).ravel())
+    if rvecs is not None:
+        _save_array(prefix + '_rvecs.npy', np.asarray(rvecs, np.float64).reshape(-1, 3))
+        _save_array(prefix + '_tvecs.npy', np.asarray(tvecs, np.float64).reshape(-1, 3))
+
+    meta = read_meta(path)
+    meta['lenses'][lens] = {
+        'model': model,
+        'csi': 0.0 if csi is None else float(csi),
+        'rms': None if rms is None else float(rms),
+        'image_size': None if image_size is None else [int(n) for n in image_size],
+        'board': None if board is None else [int(n) for n in board],
+        'serial': serial,
+        'views': None if rvecs is None else len(rvecs),
+        'calibrated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    _write_meta(path, meta)
+
+
+def load_lens(path: str, lens: Optional[str] = None) -> dict:
+    """
+    Loads the calibration of a lens.
+
+    Args:
+    path: Directory of the store.
+    lens: Name of the lens, may be omitted when the store holds a single one.
+
+    Returns:
+    calibration: Metadata of the lens (model, csi, rms, image_size, board,
+    serial...) with the arrays 'K' and 'D', and 'rvecs' and 'tvecs' when
+    they were saved.
+    """
+    lenses = read_meta(path)['lenses']
+    if lens is None and len(lenses) == 1:
+        lens = next(iter(lenses))
+    if lens not in lenses:
+        raise KeyError(f"No lens {lens!r} in the calibration store {path}, it holds {sorted(lenses)}")
+    calibration = dict(lenses[lens], lens=lens)
+    prefix = os.path.join(path, 'lenses', lens)
+    for name in ('K', 'D', 'rvecs', 'tvecs'):
+        if os.path.exists(f"{prefix}_{name}.npy"):
+            calibration[name] = np.load(f"{prefix}_{name}.npy")
+    return calibration
+
+
+def save_remap(path: str, name: str, map1: np.ndarray, map2: np.ndarray, **info) -> None:
+    """
+    Saves remap tables derived from the calibrations of the store.
+
+    Args:
+    path: Directory of the store, created if needed.
+    name: Name of the tables, which identifies their parameters.
+    map1, map2: The tables, as given to cv2.remap.
+    info: Parameters of the tables kept in the metadata, e.g. their sizes.
+    """
+    prefix = os.path.join(path, 'remaps', name)
+    _save_array(prefix + '_map1.npy', map1)
+    _save_array(prefix + '_map2.npy', map2)
+    meta = read_meta(path)
+    meta['remaps'][name] = {key: list(value) if isinstance(value, tuple) else value for key, value in info.items()}
+    _write_meta(path, meta)
+
+
+def load_remap(path: str, name: str, mmap: bool = True) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Loads remap tables saved by save_remap.
+
+    Args:
+    path: Directory of the store.
+    name: Name of the tables.
+    mmap: Map the tables read-only instead of reading them.
+
+    Returns:
+    tables: map1 and map2, or None if the store does not hold them.
+    """
+    # The files alone tell whether the tables exist, concurrent writers
+    # may have raced on the metadata
+    prefix = os.path.join(path, 'remaps', name)
+    if not (os.path.exists(prefix + '_map1.npy') and os.path.exists(prefix + '_map2.npy')):
+        return None
+    mode = 'r' if mmap else None
+    return np.load(prefix + '_map1.npy', mmap_mode=mode), np.load(prefix + '_map2.npy', mmap_mode=mode)
+
+
+def import_npz(path: str, lens: str, npz: str, serial: Optional[str] = None) -> None:
+    """
+    Imports a calibration saved by np.savez, as calibration/main.py did
+    before the store.
+
+    Args:
+    path: Directory of the store.
+    lens: Name of the lens.
+    npz: The .npz file, with 'mtx' and 'dist' or 'K' and 'D'.
+    serial: Serial number of the camera the lens belongs to.
+    """
+    with np.load(npz) as data:
+        mtx = data['K'] if 'K' in data else data['mtx']
+        dist = data['D'] if 'D' in data else data['dist']
+        csi = float(data['csi']) if 'csi' in data else 0.0
+        model = str(data['model']) if 'model' in data else 'pinhole'
+        rvecs = data['rvecs'] if 'rvecs' in data else None
+        tvecs = data['tvecs'] if 'tvecs' in data else None
+    save_lens(path, lens, mtx, dist, None if model == 'fisheye' else csi, model, serial=serial, rvecs=rvecs, tvecs=tvecs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Show a calibration store, or import calibration files into it.')
+    parser.add_argument('store', help='Directory of the store.')
+    parser.add_argument('--import', dest='imports', nargs=2, action='append', metavar=('LENS', 'NPZ'), help='Import the calibration of a lens saved by np.savez. Can be repeated.')
+    parser.add_argument('--serial', help='Serial number of the camera of the imported lenses.')
+    args = parser.parse_args()
+
+    for lens, npz in args.imports or []:
+        import_npz(args.store, lens, npz, args.serial)
+
+    meta = read_meta(args.store)
+    print(f"Calibration store {args.store}, version {meta['version']}")
+    for lens, info in meta['lenses'].items():
+        print(f"\n Lens {lens}:")
+        for key, value in info.items():
+            print(f"{key}: {value}")
+        print(load_lens(args.store, lens)['K'])
+    print(f"\n {len(meta['remaps'])} remap table(s)")
+
+
+if __name__ == '__main__':
+    main()
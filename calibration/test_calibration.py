@@ -0,0 +1,48 @@
+"""
+Tests of the calibration on the dataset bundled in the repository.
+
+    python3 -m pytest calibration
+"""
+
+import glob
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import calibration
+
+
+_dataset = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataset')
+_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+@pytest.fixture(scope='module')
+def corners():
+    images = sorted(glob.glob(os.path.join(_dataset, '*')))
+    return calibration.find_corners(images, (5, 9), _criteria)
+
+
+@pytest.mark.parametrize('model', ['pinhole', 'fisheye', 'omni'])
+def test_calibrate_camera(corners, model):
+    objpoints, imgpoints, img_shape = corners
+    mtx, dist, rvecs, tvecs, csi, rms = calibration.calibrate_camera(objpoints, imgpoints, img_shape, model)
+    assert np.all(np.isfinite(mtx)) and np.all(np.isfinite(dist))
+    assert 0 < mtx[0, 2] < img_shape[0] and 0 < mtx[1, 2] < img_shape[1]
+    assert len(rvecs) == len(tvecs) >= 3
+    assert np.isfinite(rms)
+
+
+@pytest.mark.parametrize('model', ['pinhole', 'fisheye', 'omni'])
+def test_calibrate_camera_without_views(model):
+    with pytest.raises(ValueError):
+        calibration.calibrate_camera([], [], (640, 480), model)
+
+
+def test_compare_detection_matches_the_grid_order():
+    # At this size the downscaled detection orders the grid from the other end
+    image = os.path.join(os.path.dirname(_dataset), 'dataset_back', 'back14.jpg')
+    report = calibration.compare_detection([image], (5, 9), _criteria, 200)
+    assert report['downscaled_found'] == 1
+    assert report['max_distance_px'] < 10
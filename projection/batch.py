@@ -0,0 +1,162 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    batch.py                                           :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/30 11:05:48 by abrar             #+#    #+#              #
+#    Updated: 2024/09/30 11:05:48 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Projection of whole directories of back/front pairs, without any window.
+
+The pairs, e.g. back/backN.jpg and front/frontN.jpg, are matched by the
+number in their file names and spread over a pool of processes. Each one is
+either stitched into an equirectangular panorama or rendered on a sphere.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional, Tuple
+
+import cv2
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+import equirect
+from equirect import pair_frames
+from sphere import sphere_texture
+
+
+# Settings of the worker processes, see _init
+_settings: dict = {}
+
+
+def _init(settings: dict) -> None:
+    _settings.update(settings)
+
+
+def _render_sphere(back: np.ndarray, front: np.ndarray, resolution: int) -> np.ndarray:
+    """
+    Renders the pair on a sphere as sphere.py displays it.
+    """
+    left = cv2.cvtColor(cv2.resize(back, (resolution, resolution)), cv2.COLOR_BGR2RGB) / 255.0
+    right = cv2.cvtColor(cv2.resize(front, (resolution, resolution)), cv2.COLOR_BGR2RGB) / 255.0
+    x, y, z, facecolors = sphere_texture(left, right, resolution)
+
+    fig = plt.figure(figsize=(8, 8))
+    ax = fig.add_subplot(111, projection='3d')
+    ax.plot_surface(x, y, z, rstride=1, cstride=1, facecolors=facecolors, antialiased=True, shade=False)
+    ax.set_axis_off()
+    ax.set_box_aspect([1,1,1])
+    fig.canvas.draw()
+    image = np.asarray(fig.canvas.buffer_rgba())[..., :3]
+    plt.close(fig)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+
+def _project(job: Tuple[int, str, str, str]) -> Tuple[int, Optional[str]]:
+    """
+    Projects one pair and writes the output. Returns the index of the pair
+    and the error, if any.
+    """
+    i, back_path, front_path, output = job
+    try:
+        back, front = cv2.imread(back_path), cv2.imread(front_path)
+        if back is None or front is None:
+            return i, "cannot read the images"
+        if _settings['mode'] == 'equirect':
+            image = equirect.pair_to_equirect(back, front, _settings['out_size'],
+                                              _settings['calibrations'], _settings['cache_dir'])
+        else:
+            image = _render_sphere(back, front, _settings['resolution'])
+
+        # Written aside then renamed, so that an interrupted run never leaves
+        # a partial output behind for --resume
+        ok, data = cv2.imencode(os.path.splitext(output)[1], image)
+        if not ok:
+            return i, "cannot encode the output"
+        with open(output + '.part', 'wb') as handle:
+            handle.write(data)
+        os.replace(output + '.part', output)
+        return i, None
+    except Exception as e:
+        return i, repr(e)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Project directories of back/front pairs, without any window.')
+    parser.add_argument('back', help='Directory of the images of the back lens.')
+    parser.add_argument('front', help='Directory of the images of the front lens.')
+    parser.add_argument('-o', '--output', default='projected/', help='Directory to save the outputs in. Default is projected/ .')
+    parser.add_argument('--mode', choices=['equirect', 'sphere'], default='equirect', help='Stitch the pairs into panoramas, or render them on a sphere. Default is equirect.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of processes. Default is the number of CPUs.')
+    parser.add_argument('--unordered', action='store_true', help='Report the pairs as soon as they are done instead of in order.')
+    parser.add_argument('--resume', action='store_true', help='Skip the pairs whose output already exists.')
+    parser.add_argument('--width', type=int, help='Width of the panoramas, their height is half of it. Default is twice the height of the inputs.')
+    parser.add_argument('--calibration', nargs=2, metavar=('BACK', 'FRONT'), help='Calibration files of the back and front lenses, see equirect.py.')
+    parser.add_argument('--store', help='Calibration store holding the back and front lenses, see calibration/store.py, instead of --calibration.')
+    parser.add_argument('--cache-dir', help='Directory where the remap tables are kept between runs, the workers map them from there. Default is the store with --store, .remap_cache otherwise.')
+    parser.add_argument('--resolution', type=int, default=180, help='Number of parallels of the sphere. Default is 180.')
+    args = parser.parse_args()
+
+    calibrations = (None, None)
+    if args.store:
+        calibrations = (equirect.load_calibration(args.store, 'back'), equirect.load_calibration(args.store, 'front'))
+    elif args.calibration:
+        calibrations = tuple(equirect.load_calibration(path) for path in args.calibration)
+    settings = {
+        'mode': args.mode,
+        'out_size': (args.width, args.width // 2) if args.width else None,
+        'calibrations': calibrations,
+        'cache_dir': args.cache_dir or args.store or '.remap_cache',
+        'resolution': args.resolution,
+    }
+    prefix = 'equirect' if args.mode == 'equirect' else 'sphere'
+    os.makedirs(args.output, exist_ok=True)
+
+    pairs = pair_frames(args.back, args.front)
+    jobs = [(i, back, front, os.path.join(args.output, f"{prefix}{i}.jpg")) for i, back, front in pairs]
+    if args.resume:
+        jobs = [job for job in jobs if not os.path.exists(job[3])]
+    print(f"{len(pairs)} pairs found, {len(jobs)} to project.")
+    if not jobs:
+        return
+
+    first = cv2.imread(jobs[0][1])
+    if args.mode == 'equirect' and first is not None:
+        # Compute the remap tables once, the workers then load them from the disk cache
+        height, width = first.shape[:2]
+        equirect.remap_tables((width, height), settings['out_size'] or (2 * height, height),
+                              settings['calibrations'], settings['cache_dir'])
+
+    start = time.perf_counter()
+    done = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init, initargs=(settings,)) as executor:
+        if args.unordered:
+            results = (future.result() for future in as_completed([executor.submit(_project, job) for job in jobs]))
+        else:
+            results = executor.map(_project, jobs, chunksize=max(1, len(jobs) // (8 * args.jobs)))
+        for i, error in results:
+            done += 1
+            if error is not None:
+                failed += 1
+                print(f"Error: pair {i} skipped : {error}")
+            if done % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{done}/{len(jobs)} pairs ({done / elapsed:.1f} fps)")
+
+    elapsed = time.perf_counter() - start
+    print(f"{done - failed} pairs projected, {failed} failed, in {elapsed:.2f}s ({done / max(elapsed, 1e-9):.1f} fps).")
+
+
+if __name__ == '__main__':
+    main()
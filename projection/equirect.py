@@ -0,0 +1,330 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    equirect.py                                        :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/26 10:37:41 by abrar             #+#    #+#              #
+#    Updated: 2024/09/26 10:37:41 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Stitching of the two lenses of the camera into an equirectangular panorama.
+
+The images of the back and front lenses are placed side by side in a single
+source image, either as they are in a dual-fisheye frame or by concatenating
+a back/front pair. Every pixel of the panorama is then looked up in that
+source through a remap table, so that a frame is converted with a single
+cv2.remap. The tables only depend on the image sizes and on the calibration
+of the lenses: they are computed once and cached in memory and on disk, in a
+calibration store (see calibration/store.py) from which they are mapped.
+
+The back lens faces the center of the panorama and the front lens its
+edges, as in the live preview of the camera. Each lens is either:
+- calibrated with the unified omnidirectional model, as in the Archive
+  (K, csi and optionally the distortion D), or with the equidistant
+  fisheye model (K and D), for fisheye images, see calibration/main.py;
+- None, for the half-equirectangular views saved by getLivePreview.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sys
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# The calibration store is shared with the calibration scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'calibration'))
+import store
+
+__all__ = ['load_calibration', 'remap_tables', 'to_equirect', 'pair_to_equirect',
+           'frame_index', 'pair_frames']
+
+# Bumped whenever the content of the tables changes, to invalidate the disk cache
+_TABLES_VERSION = 1
+
+# Remap tables already computed, by key
+_tables: dict = {}
+
+
+def load_calibration(path: str, lens: Optional[str] = None) -> dict:
+    """
+    Loads the calibration of a lens from a .npz file or a calibration store.
+
+    Args:
+        path (str): File holding the camera matrix as 'K' or 'mtx', the
+            mirror parameter as 'csi' or 'xi' (0 if missing), the
+            distortion coefficients as 'D' or 'dist' (none if missing) and
+            the 'model', as written by calibration/main.py. Or the
+            directory of a calibration store.
+        lens (Optional[str]): Lens to load from a store, may be omitted
+            when the store holds a single one.
+
+    Returns:
+        dict: The calibration with the keys 'K', 'csi', 'D' and 'model',
+            'fisheye' or 'omni' (the pinhole model is csi = 0).
+    """
+    if os.path.isdir(path):
+        data = store.load_lens(path, lens)
+        K, csi, D, model = data['K'], data['csi'], data['D'], data['model']
+    else:
+        with np.load(path) as data:
+            K = data['K'] if 'K' in data else data['mtx']
+            csi = data['csi'] if 'csi' in data else data['xi'] if 'xi' in data else 0.0
+            D = data['D'] if 'D' in data else data['dist'] if 'dist' in data else np.zeros(4)
+            model = str(data['model']) if 'model' in data else 'omni'
+    return {'K': np.asarray(K, dtype=np.float64).reshape(3, 3),
+            'csi': float(np.asarray(csi).ravel()[0]),
+            'D': np.asarray(D, dtype=np.float64).ravel(),
+            'model': 'fisheye' if model == 'fisheye' else 'omni'}
+
+
+def _directions(out_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Longitude, latitude and unit direction of the center of every pixel of
+    the panorama. The direction is in the frame of the back lens: x to the
+    right, y downwards and z along its optical axis.
+    """
+    width, height = out_size
+    lon = ((np.arange(width, dtype=np.float64) + 0.5) / width - 0.5) * 2.0 * np.pi
+    lat = (0.5 - (np.arange(height, dtype=np.float64) + 0.5) / height) * np.pi
+    lon, lat = np.meshgrid(lon, lat)
+    X = np.stack((np.cos(lat) * np.sin(lon), -np.sin(lat), np.cos(lat) * np.cos(lon)))
+    return lon, lat, X
+
+
+def _project_omni(X: np.ndarray, calibration: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Projects unit directions with the unified omnidirectional model: the
+    direction is projected from a point at distance csi behind the center
+    of the sphere, distorted, then mapped by K.
+    """
+    K, csi, D = calibration['K'], calibration['csi'], calibration['D']
+    den = X[2] + csi
+    x = X[0] / den
+    y = X[1] / den
+
+    k1, k2, p1, p2, k3 = np.pad(D[:5], (0, 5 - len(D[:5])))
+    r2 = x * x + y * y
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+    xd = x * radial + 2 * p1 * x * y + p2 * (r2 + 2 * x * x)
+    yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * x * y
+
+    u = K[0, 0] * xd + K[0, 1] * yd + K[0, 2]
+    v = K[1, 1] * yd + K[1, 2]
+    return u, v
+
+
+def _project_fisheye(X: np.ndarray, calibration: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Projects unit directions with the equidistant fisheye model of
+    cv2.fisheye: the distance to the center grows with the angle to the
+    optical axis, distorted by an odd polynomial.
+    """
+    K, D = calibration['K'], calibration['D']
+    r = np.hypot(X[0], X[1])
+    theta = np.arctan2(r, X[2])
+
+    k1, k2, k3, k4 = np.pad(D[:4], (0, 4 - len(D[:4])))
+    theta2 = theta * theta
+    theta_d = theta * (1 + theta2 * (k1 + theta2 * (k2 + theta2 * (k3 + theta2 * k4))))
+    scale = np.divide(theta_d, r, out=np.ones_like(r), where=r > 0)
+    x = X[0] * scale
+    y = X[1] * scale
+
+    u = K[0, 0] * x + K[0, 1] * y + K[0, 2]
+    v = K[1, 1] * y + K[1, 2]
+    return u, v
+
+
+def _compute_tables(lens_size: Tuple[int, int], out_size: Tuple[int, int],
+                    calibrations: Tuple[Optional[dict], Optional[dict]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the position in the source image of every pixel of the panorama.
+    """
+    lens_width, lens_height = lens_size
+    lon, lat, X = _directions(out_size)
+    back = X[2] >= 0
+
+    map_x = np.empty(lon.shape, dtype=np.float64)
+    map_y = np.empty(lon.shape, dtype=np.float64)
+    # The front lens is the back one turned by half a turn around the y axis
+    for i, (mask, calibration) in enumerate(((back, calibrations[0]), (~back, calibrations[1]))):
+        if calibration is None:
+            # Half-equirectangular view, 180 degrees wide and centered on the lens
+            lens_lon = lon[mask] if i == 0 else np.mod(lon[mask], 2.0 * np.pi) - np.pi
+            u = (lens_lon / np.pi + 0.5) * lens_width - 0.5
+            v = (0.5 - lat[mask] / np.pi) * lens_height - 0.5
+        else:
+            lens_X = X[:, mask] if i == 0 else X[:, mask] * np.array([[-1.0], [1.0], [-1.0]])
+            if calibration.get('model') == 'fisheye':
+                u, v = _project_fisheye(lens_X, calibration)
+            else:
+                u, v = _project_omni(lens_X, calibration)
+        # The front lens is on the right of the back one in the source
+        map_x[mask] = u + i * lens_width
+        map_y[mask] = v
+
+    return map_x.astype(np.float32), map_y.astype(np.float32)
+
+
+def _key(lens_size: Tuple[int, int], out_size: Tuple[int, int],
+         calibrations: Tuple[Optional[dict], Optional[dict]]) -> str:
+    digest = hashlib.sha1(repr((_TABLES_VERSION, lens_size, out_size)).encode())
+    for calibration in calibrations:
+        if calibration is None:
+            digest.update(b'equirect')
+        else:
+            digest.update(calibration.get('model', 'omni').encode())
+            for name in ('K', 'csi', 'D'):
+                digest.update(np.ascontiguousarray(calibration[name], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def remap_tables(lens_size: Tuple[int, int], out_size: Tuple[int, int],
+                 calibrations: Tuple[Optional[dict], Optional[dict]] = (None, None),
+                 cache_dir: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the remap tables from the source image of two lenses to the
+    panorama, computed on the first call for these sizes and calibrations.
+
+    Args:
+        lens_size (Tuple[int, int]): Width and height of the image of one lens.
+        out_size (Tuple[int, int]): Width and height of the panorama.
+        calibrations (Tuple[Optional[dict], Optional[dict]]): Calibrations
+            of the back and front lenses, see load_calibration, or None for
+            half-equirectangular views.
+        cache_dir (Optional[str]): Calibration store where the tables are
+            kept between runs, none by default. They are memory-mapped from
+            it, so that the processes using the same tables share them.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The fixed-point tables for cv2.remap.
+    """
+    key = _key(tuple(lens_size), tuple(out_size), calibrations)
+    if key in _tables:
+        return _tables[key]
+
+    name = f"equirect_{key}"
+    tables = store.load_remap(cache_dir, name) if cache_dir else None
+    if tables is None:
+        map_x, map_y = _compute_tables(lens_size, out_size, calibrations)
+        tables = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        if cache_dir:
+            store.save_remap(cache_dir, name, *tables, lens_size=tuple(lens_size), out_size=tuple(out_size))
+
+    _tables[key] = tables
+    return tables
+
+
+def to_equirect(frame: np.ndarray, out_size: Optional[Tuple[int, int]] = None,
+                calibrations: Tuple[Optional[dict], Optional[dict]] = (None, None),
+                cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Converts an image holding the back lens on its left half and the front
+    lens on its right half, e.g. a dual-fisheye frame, into a panorama.
+
+    Args:
+        frame (np.ndarray): The image of both lenses.
+        out_size (Optional[Tuple[int, int]]): Width and height of the
+            panorama, twice as wide as high as the frame by default.
+        calibrations (Tuple[Optional[dict], Optional[dict]]): Calibrations
+            of the back and front lenses.
+        cache_dir (Optional[str]): Calibration store where the tables are kept.
+
+    Returns:
+        np.ndarray: The equirectangular panorama.
+    """
+    height, width = frame.shape[:2]
+    if out_size is None:
+        out_size = (2 * height, height)
+    map1, map2 = remap_tables((width // 2, height), out_size, calibrations, cache_dir)
+    return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+
+def pair_to_equirect(back: np.ndarray, front: np.ndarray,
+                     out_size: Optional[Tuple[int, int]] = None,
+                     calibrations: Tuple[Optional[dict], Optional[dict]] = (None, None),
+                     cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Converts the images of the back and front lenses into a panorama, see
+    to_equirect. Both images must have the same size.
+    """
+    return to_equirect(cv2.hconcat([back, front]), out_size, calibrations, cache_dir)
+
+
+def frame_index(path: str) -> int:
+    """
+    Index of a frame, i.e. the last number in its file name, -1 if none.
+    """
+    numbers = re.findall(r'\d+', os.path.basename(path))
+    return int(numbers[-1]) if numbers else -1
+
+
+def pair_frames(back_dir: str, front_dir: str, pattern: str = '*.jpg') -> list[Tuple[int, str, str]]:
+    """
+    Matches the images of the back and front lenses by index.
+
+    Args:
+        back_dir (str): Directory of the images of the back lens.
+        front_dir (str): Directory of the images of the front lens.
+        pattern (str): Pattern of the image file names.
+
+    Returns:
+        list[Tuple[int, str, str]]: The index, back and front paths of every
+            pair, sorted by index.
+    """
+    backs = {frame_index(path): path for path in glob.glob(os.path.join(back_dir, pattern))}
+    fronts = {frame_index(path): path for path in glob.glob(os.path.join(front_dir, pattern))}
+    return [(i, backs[i], fronts[i]) for i in sorted(backs.keys() & fronts.keys())]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Convert the images of the two lenses into equirectangular panoramas.')
+    parser.add_argument('inputs', nargs='+', help='Dual-lens frames, or with --pair the directories of the back and front images.')
+    parser.add_argument('--pair', action='store_true', help='Read back/front pairs, matched by the number in their file names.')
+    parser.add_argument('-o', '--output', default='equirect/', help='Directory to save the panoramas in. Default is equirect/ .')
+    parser.add_argument('--width', type=int, help='Width of the panoramas, their height is half of it. Default is twice the height of the inputs.')
+    parser.add_argument('--calibration', nargs=2, metavar=('BACK', 'FRONT'), help='Calibration files of the back and front lenses. Without them the inputs are half-equirectangular views, as saved by the live preview.')
+    parser.add_argument('--store', help='Calibration store holding the back and front lenses, see calibration/store.py, instead of --calibration.')
+    parser.add_argument('--cache-dir', help='Directory where the remap tables are kept between runs. Default is the store with --store, .remap_cache otherwise.')
+    args = parser.parse_args()
+
+    calibrations = (None, None)
+    if args.store:
+        calibrations = (load_calibration(args.store, 'back'), load_calibration(args.store, 'front'))
+    elif args.calibration:
+        calibrations = tuple(load_calibration(path) for path in args.calibration)
+    cache_dir = args.cache_dir or args.store or '.remap_cache'
+    out_size = (args.width, args.width // 2) if args.width else None
+
+    if args.pair:
+        if len(args.inputs) != 2:
+            parser.error('--pair expects the directories of the back and front images')
+        jobs = pair_frames(args.inputs[0], args.inputs[1])
+    else:
+        jobs = [(frame_index(path), path, None) for path in args.inputs]
+
+    os.makedirs(args.output, exist_ok=True)
+    start = time.perf_counter()
+    for i, first, second in jobs:
+        images = [cv2.imread(path) for path in (first, second) if path is not None]
+        if any(image is None for image in images):
+            print(f'Error: Cannot read the image(s) of frame {i}, skipped.')
+            continue
+        panorama = to_equirect(cv2.hconcat(images), out_size, calibrations, cache_dir)
+        cv2.imwrite(os.path.join(args.output, f"equirect{i}.jpg"), panorama)
+    elapsed = time.perf_counter() - start
+    print(f'{len(jobs)} panoramas in {elapsed:.2f}s ({len(jobs) / max(elapsed, 1e-9):.1f} fps).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# **************************************************************************** #
+#                                                                              #
+#                                                         :::      ::::::::    #
+#    omni.py                                            :+:      :+:    :+:    #
+#                                                     +:+ +:+         +:+      #
+#    By: abrar <abrar.patel@ensiie.eu>              +#+  +:+       +#+         #
+#                                                 +#+#+#+#+#+   +#+            #
+#    Created: 2024/09/27 14:21:06 by abrar             #+#    #+#              #
+#    Updated: 2024/09/27 14:21:06 by abrar            ###   ########.fr        #
+#                                                                              #
+# **************************************************************************** #
+
+"""
+Spherical image of an omnidirectional picture with the unified projection
+model, ported from the ImToSphere, sphgrid, omniproj and inv_omniproj
+functions of the Archive.
+
+The position in the picture of every point of the spherical image only
+depends on the calibration and on the sizes, so it is computed once as an
+index map. The picture is then sampled directly on its regular pixel grid,
+in gray levels or in color.
+"""
+
+import argparse
+import functools
+from typing import Tuple
+
+import cv2
+import numpy as np
+from equirect import load_calibration
+
+
+__all__ = ['K', 'csi', 'sphgrid', 'omniproj', 'inv_omniproj', 'sphere_map', 'im_to_sphere']
+
+# Calibration of the camera used in the Archive
+K = np.array([[425.19303, 0, 479.86729], [0, 424.86463, 541.11922], [0, 0, 1]])
+csi = 0.98754
+
+_INTERPOLATIONS = {'nearest': cv2.INTER_NEAREST, 'linear': cv2.INTER_LINEAR, 'cubic': cv2.INTER_CUBIC}
+
+# Index maps already computed, by calibration and size
+_maps: dict = {}
+
+
+@functools.lru_cache(maxsize=8)
+def _sphgrid(n: int, dtype: np.dtype) -> Tuple[np.ndarray, np.ndarray]:
+    phi = np.arange(n, dtype=dtype) * dtype.type(2 * np.pi / n)
+    theta = (2 * np.arange(n, dtype=dtype) + 1) * dtype.type(np.pi / (2 * n))
+    # Every row of phi and every column of theta are the same, the matrices
+    # are read-only views of a single vector
+    return np.broadcast_to(phi, (n, n)), np.broadcast_to(theta[:, np.newaxis], (n, n))
+
+
+def sphgrid(n: int, dtype: np.dtype = np.float64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes an equi-angular spherical grid. The grids are memoized by size
+    and dtype, they are read-only.
+
+    Args:
+        n (int): Size of the grid.
+        dtype (np.dtype): Type of the values, e.g. np.float32.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The n x n matrices phi and theta, with
+            phi[i][j] = j*2*pi/n and theta[i][j] = (2*i+1)*pi/(2*n).
+    """
+    return _sphgrid(n, np.dtype(dtype))
+
+
+def omniproj(X: np.ndarray, csi: float, dtype: np.dtype | None = None) -> np.ndarray:
+    """
+    Projects points on the normalized plane of the unified model.
+
+    Args:
+        X (np.ndarray): 3 x N matrix of the points.
+        csi (float): Mirror parameter of the camera, 0 for a pinhole camera.
+        dtype (np.dtype | None): Type of the computation, the one of X by
+            default.
+
+    Returns:
+        np.ndarray: 3 x N matrix of the homogeneous projections.
+    """
+    X = np.asarray(X, dtype=dtype)
+    rho = np.sqrt(X[0] * X[0] + X[1] * X[1] + X[2] * X[2])
+    den = X[2] + rho * X.dtype.type(csi)
+    return np.stack((X[0] / den, X[1] / den, np.ones_like(den)))
+
+
+def inv_omniproj(x: np.ndarray, csi: float, dtype: np.dtype | None = None) -> np.ndarray:
+    """
+    Lifts points of the normalized plane of the unified model back on the
+    unit sphere, the inverse of omniproj for the points with z > -csi.
+
+    Args:
+        x (np.ndarray): 2 x N or 3 x N matrix of the projections, the third
+            row is ignored.
+        csi (float): Mirror parameter of the camera.
+        dtype (np.dtype | None): Type of the computation, the one of x by
+            default.
+
+    Returns:
+        np.ndarray: 3 x N matrix of the points on the unit sphere.
+    """
+    x = np.asarray(x, dtype=dtype)
+    csi = x.dtype.type(csi)
+    r2 = x[0] * x[0] + x[1] * x[1]
+    gama = np.sqrt(1 + (1 - csi * csi) * r2)
+    lam = (csi + gama) / (r2 + 1)
+    return np.stack((lam * x[0], lam * x[1], lam - csi))
+
+
+def sphere_map(H: np.ndarray, csi: float, imsph_dim: int,
+               dtype: np.dtype = np.float64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Position in the picture of every point of the spherical image.
+
+    Args:
+        H (np.ndarray): Calibration matrix of the camera.
+        csi (float): Mirror parameter of the camera.
+        imsph_dim (int): Size of the spherical image.
+        dtype (np.dtype): Type of the computation, np.float32 is faster and
+            precise enough for pictures of a few thousand pixels.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The 0-based column and row of each
+            point, as float32 imsph_dim x imsph_dim matrices.
+    """
+    dtype = np.dtype(dtype)
+    H = np.asarray(H, dtype=np.float64)
+    key = (H.tobytes(), float(csi), imsph_dim, dtype)
+    if key not in _maps:
+        phi, theta = sphgrid(imsph_dim, dtype)
+        sin_theta = np.sin(theta[:, :1])
+        S = np.stack((np.cos(phi[:1]) * sin_theta, np.sin(phi[:1]) * sin_theta,
+                      np.broadcast_to(np.cos(theta[:, :1]), phi.shape)))
+        p = np.tensordot(H.astype(dtype), omniproj(S.reshape(3, -1), csi), axes=1)
+        p = p.reshape(3, imsph_dim, imsph_dim)
+        # The pixels of the Matlab code are numbered from 1
+        _maps[key] = ((p[0] - 1).astype(np.float32), (p[1] - 1).astype(np.float32))
+    return _maps[key]
+
+
+def im_to_sphere(I: np.ndarray, H: np.ndarray, csi: float, imsph_dim: int,
+                 interpolation: str = 'linear', dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+    Transforms an omnidirectional picture into a spherical image.
+
+    Args:
+        I (np.ndarray): The picture, in gray levels or in color.
+        H (np.ndarray): Calibration matrix of the camera.
+        csi (float): Mirror parameter of the camera.
+        imsph_dim (int): Size of the spherical image.
+        interpolation (str): 'nearest', which matches the rounding of the
+            Archive, 'linear' or 'cubic'.
+        dtype (np.dtype): Type of the computation of the positions.
+
+    Returns:
+        np.ndarray: The spherical image, with theta along the rows and phi
+            along the columns. The points outside the picture are 0.
+    """
+    map_x, map_y = sphere_map(H, csi, imsph_dim, dtype)
+    if interpolation == 'nearest':
+        # Round the positions as the Archive does
+        map_x, map_y = np.round(map_x), np.round(map_y)
+    # remap does not handle float64 pictures
+    source = I.astype(np.float32) if I.dtype == np.float64 else I
+    out = cv2.remap(source, map_x, map_y, _INTERPOLATIONS[interpolation],
+                    borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    return out.astype(I.dtype, copy=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Transform an omnidirectional picture into a spherical image.')
+    parser.add_argument('image', help='Path to the omnidirectional picture.')
+    parser.add_argument('output', help='Path to save the spherical image to.')
+    parser.add_argument('-n', '--size', type=int, default=1024, help='Size of the spherical image. Default is 1024.')
+    parser.add_argument('--calibration', help='Calibration file (.npz) holding K and csi, or calibration store. Default is the camera of the Archive.')
+    parser.add_argument('--lens', help='Lens to use from the calibration store, e.g. back, when it holds several.')
+    parser.add_argument('--gray', action='store_true', help='Read the picture in gray levels.')
+    parser.add_argument('--float32', action='store_true', help='Compute the positions in single precision.')
+    parser.add_argument('--interpolation', choices=list(_INTERPOLATIONS), default='linear', help='Sampling of the picture. Default is linear.')
+    args = parser.parse_args()
+
+    H, mirror = K, csi
+    if args.calibration:
+        try:
+            calibration = load_calibration(args.calibration, args.lens)
+        except KeyError as e:
+            print(f"Error: {e.args[0]}")
+            return
+        if calibration['model'] != 'omni':
+            print(f"Error: {args.calibration} is not a calibration of the unified model, see calibration/main.py --model omni")
+            return
+        H, mirror = calibration['K'], calibration['csi']
+
+    I = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE if args.gray else cv2.IMREAD_COLOR)
+    if I is None:
+        print(f"Error: Cannot read {args.image}")
+        return
+    cv2.imwrite(args.output, im_to_sphere(I, H, mirror, args.size, args.interpolation,
+                                              np.float32 if args.float32 else np.float64))
+
+
+if __name__ == '__main__':
+    main()
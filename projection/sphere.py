@@ -15,7 +15,37 @@ import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
 
-def project_on_sphere(img1: str, img2: str, show_axes: bool) -> None:
+def sphere_texture(left_image: np.ndarray, right_image: np.ndarray, resolution: int = 180) -> tuple:
+    """
+    Builds the sphere grid and the colors of its faces.
+
+    Args:
+        left_image (np.ndarray): RGB image of the left hemisphere, with
+            resolution rows and resolution columns.
+        right_image (np.ndarray): RGB image of the right hemisphere, same shape.
+        resolution (int): Number of parallels of the grid, there are twice as
+            many meridians.
+
+    Returns:
+        tuple: The x, y and z coordinates of the grid and its face colors.
+    """
+    # Sphere parameters
+    r = 1
+    theta, phi = np.mgrid[0.0:np.pi:resolution * 1j, 0.0:2.0*np.pi:2 * resolution * 1j]
+    x = r * np.sin(theta) * np.cos(phi)
+    y = r * np.sin(theta) * np.sin(phi)
+    z = r * np.cos(theta)
+
+    # Each hemisphere wraps its image once around half of the meridians
+    columns = np.arange(theta.shape[1]) % (theta.shape[1] // 2)
+    facecolors = np.where((y >= 0)[..., np.newaxis],
+                          right_image[:, columns],  # Right hemisphere
+                          left_image[:, columns])   # Left hemisphere
+
+    return x, y, z, facecolors
+
+
+def project_on_sphere(img1: str, img2: str, show_axes: bool, resolution: int = 180) -> None:
     """
     Projects the given images onto a sphere.
 
@@ -23,24 +53,13 @@ def project_on_sphere(img1: str, img2: str, show_axes: bool) -> None:
         img1 (str): Path to the first image.
         img2 (str): Path to the second image.
         show_axes (bool): Whether to show the axes of the sphere.
+        resolution (int): Number of parallels of the sphere grid.
     """
-    # Load the images 
-    # left_image = cv2.imread('back0.jpg')
-    # right_image = Image.open('front0.jpg')
-
-
     with Image.open(img1) as left_image, Image.open(img2) as right_image:
 
-        # Sphere parameters
-        r = 1
-        theta, phi = np.mgrid[0.0:np.pi:180j, 0.0:2.0*np.pi:360j]
-        x = r * np.sin(theta) * np.cos(phi)
-        y = r * np.sin(theta) * np.sin(phi)
-        z = r * np.cos(theta)
-        
         # Resize the images to match the dimensions of the spherical grid
-        left_image = left_image.resize((theta.shape[0], phi.shape[1] // 2))
-        right_image = right_image.resize((theta.shape[0], phi.shape[1] // 2))
+        left_image = left_image.convert('RGB').resize((resolution, resolution))
+        right_image = right_image.convert('RGB').resize((resolution, resolution))
 
         # Convert the resized images to numpy arrays
         left_image = np.array(left_image) / 255.0  # Normalize color values between 0 and 1
@@ -58,18 +77,8 @@ def project_on_sphere(img1: str, img2: str, show_axes: bool) -> None:
 
         plt.show()
 
-        # Create an array for the sphere's surface colors
-        facecolors = np.empty(x.shape + (3,), dtype=np.float64)
-
         # Apply the images to the hemispheres
-        for i in range(facecolors.shape[0]):
-            for j in range(facecolors.shape[1]):
-                if y[i, j] >= 0:
-                    # Right hemisphere
-                    facecolors[i, j] = right_image[i, j % (theta.shape[1] // 2)]
-                else:
-                    # Left hemisphere
-                    facecolors[i, j] = left_image[i, j % (theta.shape[1] // 2)]
+        x, y, z, facecolors = sphere_texture(left_image, right_image, resolution)
 
         # Create the figure and axes
         fig = plt.figure(figsize=(8, 8))
@@ -94,10 +103,11 @@ def main() -> None:
     parser.add_argument('image1', help='Path to the fisheye image on the left.')
     parser.add_argument('image2', help='Path to the fisheye image on the right.')
     parser.add_argument('--show-axes', action='store_true', help='Show the axes on the plot.')
+    parser.add_argument('--resolution', type=int, default=180, help='Number of parallels of the sphere, twice as many meridians are used. Default is 180.')
     args = parser.parse_args()
 
     print('Running...')
-    project_on_sphere(args.image1, args.image2, args.show_axes)
+    project_on_sphere(args.image1, args.image2, args.show_axes, args.resolution)
     print('Done.')
 
 